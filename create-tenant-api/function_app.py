@@ -4,10 +4,21 @@ import json
 import subprocess
 import tempfile
 import shutil
+import gzip
+import threading
+import time
+import hashlib
+import functools
+import itertools
+import re
 from pathlib import Path
 import azure.functions as func
 import requests
 import psycopg2
+import psycopg2.pool
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from urllib.parse import urlparse
 
 app = func.FunctionApp()
@@ -16,12 +27,198 @@ REPO_URL = "https://github.com/keydyy/quiz_app_ct.git"
 BRANCH_PREFIX = "deploy"
 IMAGE_NAME = "quiz_app_ct"
 GITHUB_API_URL = "https://api.github.com"
+# Supabase requires SSL; local databases (e.g. load_test.py) can relax it
+DATABASE_SSLMODE = os.environ.get("DATABASE_SSLMODE", "require")
+
+# Provisioning stages, in execution order. Each completed stage is checkpointed
+# in the tenant database so a retried CreateTenant resumes where it stopped,
+# whichever instance it lands on.
+PROVISIONING_STAGES = ["migrate", "verify", "indexes", "dispatch"]
+OPTIONAL_STAGES = ["indexes"]  # only run when requested
+IDEMPOTENCY_WAIT_SECONDS = 200  # stay below the 230s HTTP timeout on Azure
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_JOBS = 1000  # finished jobs kept for replay per instance
+
+# "per_tenant" builds an image per tenant; "shared" deploys SHARED_IMAGE (a
+# digest-pinned ghcr.io/keydyy/quiz_app_ct@sha256:... reference) for everyone
+# and passes the tenant settings to the container at runtime.
+DEPLOY_MODES = ["per_tenant", "shared"]
 
 # Konfiguracja loggingu
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Metrics, exposed in Prometheus text format by the Metrics function.
+# Values are per Function host instance.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+METRIC_DEFINITIONS = {
+    "tenant_function_requests_total": ("counter", "HTTP function invocations"),
+    "tenant_function_duration_seconds": ("histogram", "HTTP function latency"),
+    "tenant_stage_total": ("counter", "Pipeline stage executions"),
+    "tenant_stage_duration_seconds": ("histogram", "Pipeline stage latency"),
+    "github_requests_total": ("counter", "GitHub API responses by status code"),
+    "github_throttled_total": ("counter", "GitHub API responses rejected by rate limits"),
+    "cache_requests_total": ("counter", "Cache lookups by result"),
+    "cache_hit_ratio": ("gauge", "Share of cache lookups that hit"),
+    "tenant_pools": ("gauge", "Open tenant database connection pools"),
+    "tenant_pool_connections": ("gauge", "Tenant database connections by state"),
+    "dependency_circuit_state": ("gauge", "Circuit breaker state (0 closed, 1 half-open, 2 open)"),
+    "dependency_in_flight": ("gauge", "Calls in flight per dependency bulkhead"),
+    "dependency_breaker_trips_total": ("counter", "Circuit breaker transitions to open"),
+    "dependency_rejections_total": ("counter", "Calls rejected without reaching a dependency"),
+}
+
+_metrics_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> {"buckets": [...], "sum": float, "count": int}
+_gauge_collectors = []  # callables returning [(name, labels, value)]
+
+
+def _label_key(labels) -> tuple:
+    return tuple(sorted((labels or {}).items()))
+
+
+def inc_counter(name: str, labels: dict = None, value: float = 1):
+    """Increment a counter metric"""
+    key = (name, _label_key(labels))
+    with _metrics_lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe_histogram(name: str, value: float, labels: dict = None):
+    """Record one observation of a latency histogram"""
+    key = (name, _label_key(labels))
+    with _metrics_lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0, "count": 0}
+            _histograms[key] = histogram
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+
+def register_gauge_collector(collector):
+    """Register a callable that reports current gauge values at scrape time"""
+    _gauge_collectors.append(collector)
+    return collector
+
+
+@contextmanager
+def observe_stage(stage: str):
+    """Time a pipeline stage and count its outcome"""
+    started = time.monotonic()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        observe_histogram(
+            "tenant_stage_duration_seconds", time.monotonic() - started, {"stage": stage}
+        )
+        inc_counter("tenant_stage_total", {"stage": stage, "outcome": outcome})
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    """Count a cache hit or miss"""
+    inc_counter("cache_requests_total", {"cache": cache, "result": "hit" if hit else "miss"})
+
+
+def instrumented(function_name: str):
+    """Count and time an HTTP function by name and response status code"""
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(req: func.HttpRequest) -> func.HttpResponse:
+            started = time.monotonic()
+            status = "500"
+            try:
+                response = handler(req)
+                status = str(response.status_code)
+                return response
+            finally:
+                observe_histogram(
+                    "tenant_function_duration_seconds",
+                    time.monotonic() - started,
+                    {"function": function_name},
+                )
+                inc_counter(
+                    "tenant_function_requests_total",
+                    {"function": function_name, "status": status},
+                )
+
+        return wrapper
+
+    return decorator
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = [
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    ]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def render_metrics() -> str:
+    """Render every metric in the Prometheus text exposition format"""
+    samples = {name: [] for name in METRIC_DEFINITIONS}
+
+    with _metrics_lock:
+        for (name, labels), value in sorted(_counters.items()):
+            samples[name].append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), histogram in sorted(_histograms.items()):
+            for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+                bucket_labels = labels + (("le", str(bound)),)
+                samples[name].append(
+                    f"{name}_bucket{_format_labels(bucket_labels)} {count}"
+                )
+            inf_labels = labels + (("le", "+Inf"),)
+            samples[name].append(
+                f"{name}_bucket{_format_labels(inf_labels)} {histogram['count']}"
+            )
+            samples[name].append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+            samples[name].append(
+                f"{name}_count{_format_labels(labels)} {histogram['count']}"
+            )
+
+        # Hit ratios are derived from the cache counters
+        lookups = {}
+        for (name, labels), value in _counters.items():
+            if name == "cache_requests_total":
+                label_map = dict(labels)
+                hits, total = lookups.get(label_map["cache"], (0, 0))
+                if label_map["result"] == "hit":
+                    hits += value
+                lookups[label_map["cache"]] = (hits, total + value)
+        for cache, (hits, total) in sorted(lookups.items()):
+            samples["cache_hit_ratio"].append(
+                f'cache_hit_ratio{{cache="{cache}"}} {round(hits / total, 4)}'
+            )
+
+    for collector in _gauge_collectors:
+        try:
+            for name, labels, value in collector():
+                samples.setdefault(name, []).append(
+                    f"{name}{_format_labels(_label_key(labels))} {value}"
+                )
+        except Exception as e:
+            logger.warning(f"Metrics collector failed: {str(e)}")
+
+    lines = []
+    for name, name_samples in samples.items():
+        metric_type, description = METRIC_DEFINITIONS.get(name, ("gauge", name))
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.extend(name_samples)
+    return "\n".join(lines) + "\n"
+
+
 def run_command(cmd, cwd=None):
     """Execute shell command and return output with better error handling"""
     try:
@@ -83,6 +280,209 @@ def parse_database_url(database_url: str) -> dict:
         raise Exception(f"Failed to parse database URL: {str(e)}")
 
 
+# Circuit breakers and bulkheads for the external dependencies. A breaker opens
+# after BREAKER_FAILURE_THRESHOLD consecutive failed or slow calls and rejects
+# calls for BREAKER_OPEN_SECONDS; then a single half-open probe decides whether
+# it closes again. Postgres breakers are per database server so one unhealthy
+# Supabase project does not block the others; the bulkhead semaphores cap the
+# concurrent calls per dependency across the whole Function host.
+DATABASE_CONNECT_TIMEOUT = int(os.environ.get("DATABASE_CONNECT_TIMEOUT", "10"))
+GITHUB_TIMEOUT_SECONDS = float(os.environ.get("GITHUB_TIMEOUT_SECONDS", "30"))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_OPEN_SECONDS = float(os.environ.get("BREAKER_OPEN_SECONDS", "30"))
+BULKHEAD_WAIT_SECONDS = float(os.environ.get("BULKHEAD_WAIT_SECONDS", "2"))
+DEPENDENCY_LIMITS = {
+    "postgres": int(os.environ.get("POSTGRES_MAX_CONCURRENCY", "16")),
+    "github": int(os.environ.get("GITHUB_MAX_CONCURRENCY", "8")),
+}
+SLOW_CALL_SECONDS = {
+    "postgres": float(os.environ.get("POSTGRES_SLOW_CALL_SECONDS", "5")),
+    "github": float(os.environ.get("GITHUB_SLOW_CALL_SECONDS", "10")),
+}
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+_breaker_lock = threading.Lock()
+_breakers = {}  # breaker name -> state
+_bulkheads = {
+    kind: threading.BoundedSemaphore(limit) for kind, limit in DEPENDENCY_LIMITS.items()
+}
+_in_flight = {kind: 0 for kind in DEPENDENCY_LIMITS}  # guarded by _breaker_lock
+
+# A server rejecting one login (wrong password or role, unknown database)
+# says nothing about the other tenants on it. psycopg2 leaves pgcode unset
+# for connection errors, so these SQLSTATEs are also matched by message.
+POSTGRES_LOGIN_REJECTED_SQLSTATES = {"28P01", "28000", "3D000"}
+POSTGRES_LOGIN_REJECTED_MESSAGES = re.compile(
+    r'password authentication failed|no pg_hba\.conf entry|role ".*" does not exist'
+    r'|database ".*" does not exist'
+)
+
+
+class DependencyUnavailable(Exception):
+    """A call was rejected by an open circuit breaker or a full bulkhead"""
+
+
+def _reject_call(kind: str, name: str, reason: str, message: str):
+    inc_counter("dependency_rejections_total", {"dependency": kind, "reason": reason})
+    raise DependencyUnavailable(f"{name} unavailable: {message}")
+
+
+def _record_call(kind: str, name: str, error: str, probe: bool):
+    """Update a breaker with the outcome of a call; error is None on success"""
+    with _breaker_lock:
+        breaker = _breakers[name]
+        if probe:
+            breaker["probing"] = False
+        if error is None:
+            if breaker["state"] != "closed":
+                logger.info(f"Circuit breaker {name} closed")
+            breaker["state"] = "closed"
+            breaker["failures"] = 0
+            return
+
+        breaker["failures"] += 1
+        breaker["last_error"] = error
+        if breaker["state"] == "half_open" or (
+            breaker["state"] == "closed"
+            and breaker["failures"] >= BREAKER_FAILURE_THRESHOLD
+        ):
+            logger.warning(f"Circuit breaker {name} opened: {error}")
+            breaker["state"] = "open"
+            breaker["opened_at"] = time.monotonic()
+            inc_counter("dependency_breaker_trips_total", {"dependency": kind})
+
+
+def postgres_server_failure(e: Exception) -> bool:
+    """Whether a connection error counts against the Postgres server.
+
+    Everything does (timeouts, refused or reset connections, and overload
+    replies such as "too many clients" or "the database system is starting
+    up") except a rejected login (SQLSTATE 28P01, 28000 or 3D000).
+    """
+    if getattr(e, "pgcode", None):
+        return e.pgcode not in POSTGRES_LOGIN_REJECTED_SQLSTATES
+    return not POSTGRES_LOGIN_REJECTED_MESSAGES.search(str(e))
+
+
+@contextmanager
+def dependency_call(
+    kind: str, target: str = None, failures=(Exception,), counts=None
+):
+    """Guard one call to a dependency with its circuit breaker and bulkhead.
+
+    Raises DependencyUnavailable without making the call when the breaker is
+    open or the bulkhead stays full for BULKHEAD_WAIT_SECONDS. Exceptions of
+    the failures types (narrowed by the optional counts predicate) and calls
+    slower than SLOW_CALL_SECONDS count against the breaker; other failures
+    show the dependency answered and count as successful calls. The caller
+    can also report a failed call (e.g. an HTTP 503) by setting "error" on
+    the yielded dict.
+    """
+    name = f"{kind}:{target}" if target else kind
+    probe = False
+    with _breaker_lock:
+        breaker = _breakers.setdefault(
+            name,
+            {
+                "state": "closed",
+                "failures": 0,
+                "opened_at": None,
+                "probing": False,
+                "last_error": None,
+            },
+        )
+        if breaker["state"] == "open":
+            remaining = BREAKER_OPEN_SECONDS - (time.monotonic() - breaker["opened_at"])
+            if remaining > 0:
+                _reject_call(
+                    kind, name, "open", f"circuit open, retry in {int(remaining) + 1}s"
+                )
+            breaker["state"] = "half_open"
+        if breaker["state"] == "half_open":
+            if breaker["probing"]:
+                _reject_call(kind, name, "half_open", "circuit half-open, probe in flight")
+            breaker["probing"] = probe = True
+
+    if not _bulkheads[kind].acquire(timeout=BULKHEAD_WAIT_SECONDS):
+        if probe:
+            with _breaker_lock:
+                breaker["probing"] = False
+        _reject_call(
+            kind, name, "bulkhead_full", f"{DEPENDENCY_LIMITS[kind]} calls already in flight"
+        )
+    with _breaker_lock:
+        _in_flight[kind] += 1
+
+    call = {"error": None}
+    started = time.monotonic()
+    try:
+        yield call
+    except failures as e:
+        if counts is None or counts(e):
+            _record_call(kind, name, f"{type(e).__name__}: {str(e)[:200]}", probe)
+        else:
+            _record_call(kind, name, None, probe)
+        raise
+    except BaseException:
+        # Not the dependency's fault: leave the breaker as it was
+        if probe:
+            with _breaker_lock:
+                breaker["probing"] = False
+        raise
+    else:
+        elapsed = time.monotonic() - started
+        if call["error"] is None and elapsed > SLOW_CALL_SECONDS[kind]:
+            call["error"] = f"slow call: {elapsed:.1f}s"
+        _record_call(kind, name, call["error"], probe)
+    finally:
+        with _breaker_lock:
+            _in_flight[kind] -= 1
+        _bulkheads[kind].release()
+
+
+def dependency_states() -> dict:
+    """Breaker state and bulkhead usage of every dependency, for responses"""
+    now = time.monotonic()
+    with _breaker_lock:
+        breakers = {
+            name: {
+                "state": breaker["state"],
+                "failures": breaker["failures"],
+                "last_error": breaker["last_error"],
+                "retry_in": (
+                    max(0, round(BREAKER_OPEN_SECONDS - (now - breaker["opened_at"]), 1))
+                    if breaker["state"] == "open"
+                    else None
+                ),
+            }
+            for name, breaker in _breakers.items()
+        }
+        bulkheads = {
+            kind: {"limit": limit, "in_flight": _in_flight[kind]}
+            for kind, limit in DEPENDENCY_LIMITS.items()
+        }
+    return {"breakers": breakers, "bulkheads": bulkheads}
+
+
+@register_gauge_collector
+def _dependency_gauges():
+    states = dependency_states()
+    samples = [
+        ("dependency_circuit_state", {"dependency": name}, BREAKER_STATES[b["state"]])
+        for name, b in states["breakers"].items()
+    ]
+    samples += [
+        ("dependency_in_flight", {"dependency": kind}, b["in_flight"])
+        for kind, b in states["bulkheads"].items()
+    ]
+    return samples
+
+
+def dependency_error_status(error: Exception) -> int:
+    """503 when a dependency guard rejected the call, 500 otherwise"""
+    return 503 if isinstance(error, DependencyUnavailable) else 500
+
+
 def connect_to_database(database_url: str):
     """Create a direct PostgreSQL connection"""
     try:
@@ -91,23 +491,106 @@ def connect_to_database(database_url: str):
             f"Connecting to database at {db_params['host']}:{db_params['port']}"
         )
 
-        connection = psycopg2.connect(
-            host=db_params["host"],
-            port=db_params["port"],
-            database=db_params["database"],
-            user=db_params["user"],
-            password=db_params["password"],
-            sslmode="require",  # Supabase requires SSL
-        )
+        with observe_stage("connect"), dependency_call(
+            "postgres",
+            f"{db_params['host']}:{db_params['port']}",
+            failures=(psycopg2.OperationalError,),
+            counts=postgres_server_failure,
+        ):
+            connection = psycopg2.connect(
+                host=db_params["host"],
+                port=db_params["port"],
+                database=db_params["database"],
+                user=db_params["user"],
+                password=db_params["password"],
+                sslmode=DATABASE_SSLMODE,
+                connect_timeout=DATABASE_CONNECT_TIMEOUT,
+            )
 
         logger.info("Successfully connected to PostgreSQL database")
         return connection
 
+    except DependencyUnavailable:
+        raise
     except Exception as e:
         logger.error(f"Failed to connect to database: {str(e)}")
         raise Exception(f"Database connection failed: {str(e)}")
 
 
+# Connection pools for tenant databases, one per database URL
+TENANT_POOL_MAX_CONNECTIONS = int(os.environ.get("TENANT_POOL_MAX_CONNECTIONS", "4"))
+_tenant_pools_lock = threading.Lock()
+_tenant_pools = {}
+
+
+def get_tenant_pool(database_url: str):
+    """Return the shared connection pool of a tenant database, creating it lazily"""
+    with _tenant_pools_lock:
+        pool = _tenant_pools.get(database_url)
+        if pool is None:
+            db_params = parse_database_url(database_url)
+            pool = psycopg2.pool.ThreadedConnectionPool(
+                0,
+                TENANT_POOL_MAX_CONNECTIONS,
+                host=db_params["host"],
+                port=db_params["port"],
+                database=db_params["database"],
+                user=db_params["user"],
+                password=db_params["password"],
+                sslmode=DATABASE_SSLMODE,
+                connect_timeout=DATABASE_CONNECT_TIMEOUT,
+            )
+            _tenant_pools[database_url] = pool
+        return pool
+
+
+@contextmanager
+def pooled_connection(database_url: str):
+    """Borrow a connection from the tenant pool; broken connections are discarded"""
+    pool = get_tenant_pool(database_url)
+    db_params = parse_database_url(database_url)
+    target = f"{db_params['host']}:{db_params['port']}"
+    # Pool exhaustion is our own limit, only connection errors trip the breaker
+    with dependency_call(
+        "postgres",
+        target,
+        failures=(psycopg2.OperationalError,),
+        counts=postgres_server_failure,
+    ):
+        connection = pool.getconn()
+    try:
+        yield connection
+        connection.rollback()  # never hand back a connection mid-transaction
+    except Exception:
+        if not connection.closed:
+            connection.rollback()
+        raise
+    finally:
+        pool.putconn(connection, close=bool(connection.closed))
+
+
+def close_tenant_pool(database_url: str):
+    """Close and forget the connection pool of a tenant database"""
+    with _tenant_pools_lock:
+        pool = _tenant_pools.pop(database_url, None)
+    if pool:
+        pool.closeall()
+
+
+@register_gauge_collector
+def _tenant_pool_gauges():
+    with _tenant_pools_lock:
+        pools = list(_tenant_pools.values())
+    # ThreadedConnectionPool keeps borrowed connections in _used, idle in _pool
+    in_use = sum(len(pool._used) for pool in pools)
+    idle = sum(len(pool._pool) for pool in pools)
+    return [
+        ("tenant_pools", None, len(pools)),
+        ("tenant_pool_connections", {"state": "in_use"}, in_use),
+        ("tenant_pool_connections", {"state": "idle"}, idle),
+    ]
+
+
 def clean_sql_content(sql_content: str) -> str:
     """Clean SQL content by removing comments and empty lines"""
     lines = sql_content.split("\n")
@@ -153,6 +636,28 @@ def split_sql_statements(sql_content: str) -> list:
     return statements
 
 
+# Parsed migration statements and schema.prisma models, keyed by a hash of the
+# source text. Cached values are shared between requests: treat as read-only.
+PARSED_SOURCE_CACHE_SIZE = 8
+_parsed_source_lock = threading.Lock()
+_parsed_sources = {}
+
+
+def cached_parse(text: str, parser):
+    """Return parser(text), reusing the result for identical text"""
+    key = (parser.__name__, hashlib.sha256(text.encode("utf-8")).hexdigest())
+    with _parsed_source_lock:
+        parsed = _parsed_sources.get(key)
+    record_cache_lookup("parsed_source", parsed is not None)
+    if parsed is None:
+        parsed = parser(text)
+        with _parsed_source_lock:
+            _parsed_sources[key] = parsed
+            while len(_parsed_sources) > PARSED_SOURCE_CACHE_SIZE:
+                del _parsed_sources[next(iter(_parsed_sources))]
+    return parsed
+
+
 def execute_migration_sql(connection, migration_sql: str):
     """Execute migration SQL statements with improved parsing"""
     try:
@@ -163,7 +668,7 @@ def execute_migration_sql(connection, migration_sql: str):
         logger.info(f"Migration SQL preview: {migration_sql[:500]}...")
 
         # Split into statements
-        statements = split_sql_statements(migration_sql)
+        statements = cached_parse(migration_sql, split_sql_statements)
         logger.info(f"Found {len(statements)} SQL statements to execute")
 
         # Log each statement for debugging
@@ -178,8 +683,9 @@ def execute_migration_sql(connection, migration_sql: str):
             if statement.strip():
                 try:
                     logger.info(f"Executing statement {i+1}/{len(statements)}")
-                    cursor.execute(statement)
-                    connection.commit()
+                    with observe_stage("statement"):
+                        cursor.execute(statement)
+                        connection.commit()
                     successful_statements += 1
                     logger.info(f"Statement {i+1} executed successfully")
 
@@ -265,8 +771,423 @@ def verify_database_structure(connection):
         # Don't raise here, as verification is just for logging
 
 
-def init_database_with_migrations(database_url: str, local_path: str):
-    """Initialize database using migration files with direct PostgreSQL connection"""
+PRISMA_SCALAR_TYPES = {
+    "String": ("TEXT", "text"),
+    "Int": ("INTEGER", "integer"),
+    "BigInt": ("BIGINT", "bigint"),
+    "Float": ("DOUBLE PRECISION", "double precision"),
+    "Decimal": ("DECIMAL(65,30)", "numeric(65,30)"),
+    "Boolean": ("BOOLEAN", "boolean"),
+    "DateTime": ("TIMESTAMP(3)", "timestamp(3) without time zone"),
+    "Json": ("JSONB", "jsonb"),
+    "Bytes": ("BYTEA", "bytea"),
+}
+
+PRISMA_NATIVE_TYPES = {
+    "Uuid": ("UUID", "uuid"),
+    "Text": ("TEXT", "text"),
+    "Json": ("JSON", "json"),
+    "JsonB": ("JSONB", "jsonb"),
+    "Integer": ("INTEGER", "integer"),
+    "SmallInt": ("SMALLINT", "smallint"),
+    "BigInt": ("BIGINT", "bigint"),
+    "Boolean": ("BOOLEAN", "boolean"),
+    "Date": ("DATE", "date"),
+    "VarChar": ("VARCHAR({0})", "character varying({0})"),
+    "Char": ("CHAR({0})", "character({0})"),
+    "Timestamp": ("TIMESTAMP({0})", "timestamp({0}) without time zone"),
+    "Timestamptz": ("TIMESTAMPTZ({0})", "timestamp({0}) with time zone"),
+}
+
+PRISMA_REFERENTIAL_ACTIONS = {
+    "NoAction": "NO ACTION",
+    "Restrict": "RESTRICT",
+    "Cascade": "CASCADE",
+    "SetNull": "SET NULL",
+    "SetDefault": "SET DEFAULT",
+}
+
+
+def _prisma_attribute_args(attrs: str, name: str):
+    """Return the raw argument string of a Prisma attribute such as @default(...)"""
+    marker = f"{name}("
+    start = attrs.find(marker)
+    if start < 0:
+        return None
+    depth = 0
+    for i in range(start + len(marker) - 1, len(attrs)):
+        if attrs[i] == "(":
+            depth += 1
+        elif attrs[i] == ")":
+            depth -= 1
+            if depth == 0:
+                return attrs[start + len(marker) : i]
+    return None
+
+
+def _prisma_list_arg(args: str, name: str) -> list:
+    """Extract a named list argument, e.g. fields: [a, b]"""
+    match = re.search(rf"{name}\s*:\s*\[([^\]]*)\]", args or "")
+    if not match:
+        return []
+    return [item.strip() for item in match.group(1).split(",") if item.strip()]
+
+
+def _strip_prisma_comment(line: str) -> str:
+    """Drop a // comment from a schema line, leaving // inside strings alone"""
+    in_string = False
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if in_string and char == "\\":
+            i += 2
+            continue
+        if char == '"':
+            in_string = not in_string
+        elif not in_string and line.startswith("//", i):
+            return line[:i]
+        i += 1
+    return line
+
+
+def parse_prisma_schema(schema_text: str) -> dict:
+    """Parse the models and enums of a schema.prisma file into a table description"""
+    blocks = re.findall(
+        r"^(model|enum)\s+(\w+)\s*\{(.*?)^\}", schema_text, re.MULTILINE | re.DOTALL
+    )
+    enums = {}
+    raw_models = {}
+    for kind, name, body in blocks:
+        lines = [
+            _strip_prisma_comment(line).strip()
+            for line in body.split("\n")
+            if line.strip()
+        ]
+        lines = [line for line in lines if line]
+        if kind == "enum":
+            enums[name] = [line.split()[0] for line in lines if not line.startswith("@@")]
+        else:
+            raw_models[name] = lines
+
+    # Table names first, relation fields reference models by their Prisma name
+    table_names = {}
+    for name, lines in raw_models.items():
+        table_names[name] = name
+        for line in lines:
+            if line.startswith("@@map("):
+                table_names[name] = re.search(r'"([^"]+)"', line).group(1)
+
+    tables = {}
+    for name, lines in raw_models.items():
+        table = table_names[name]
+        columns = {}
+        primary_key = []
+        uniques = []
+        foreign_keys = []
+
+        for line in lines:
+            if line.startswith("@@"):
+                if line.startswith("@@id("):
+                    primary_key = _prisma_list_arg(line, "fields") or [
+                        f.strip() for f in line[6:-2].split(",")
+                    ]
+                elif line.startswith("@@unique("):
+                    uniques.append(
+                        _prisma_list_arg(line, "fields")
+                        or [f.strip() for f in line[10:-2].split(",")]
+                    )
+                continue
+
+            parts = line.split(None, 2)
+            if len(parts) < 2:
+                continue
+            field, field_type = parts[0], parts[1]
+            attrs = parts[2] if len(parts) > 2 else ""
+            is_list = field_type.endswith("[]")
+            optional = field_type.endswith("?")
+            base_type = field_type.rstrip("?").replace("[]", "")
+
+            if base_type in raw_models:
+                # Relation field; the owning side carries the foreign key
+                relation = _prisma_attribute_args(attrs, "@relation")
+                fields = _prisma_list_arg(relation, "fields")
+                if fields:
+                    on_delete = re.search(r"onDelete\s*:\s*(\w+)", relation)
+                    on_update = re.search(r"onUpdate\s*:\s*(\w+)", relation)
+                    foreign_keys.append(
+                        {
+                            "columns": fields,
+                            "references_table": table_names[base_type],
+                            "references": _prisma_list_arg(relation, "references"),
+                            "on_delete": PRISMA_REFERENTIAL_ACTIONS[
+                                on_delete.group(1)
+                                if on_delete
+                                else ("SetNull" if optional else "Restrict")
+                            ],
+                            "on_update": PRISMA_REFERENTIAL_ACTIONS[
+                                on_update.group(1) if on_update else "Cascade"
+                            ],
+                        }
+                    )
+                continue
+
+            column = field
+            mapped = _prisma_attribute_args(attrs, "@map")
+            if mapped:
+                column = mapped.strip().strip('"')
+
+            native = re.search(r"@db\.(\w+)(?:\(([^)]*)\))?", attrs)
+            if base_type in enums:
+                sql_type = f'"public"."{base_type}"'
+                catalog_type = base_type
+            elif native and native.group(1) in PRISMA_NATIVE_TYPES:
+                sql_type, catalog_type = PRISMA_NATIVE_TYPES[native.group(1)]
+                precision = native.group(2) or "3"
+                sql_type = sql_type.format(precision)
+                catalog_type = catalog_type.format(precision)
+            else:
+                sql_type, catalog_type = PRISMA_SCALAR_TYPES[base_type]
+
+            default = _prisma_attribute_args(attrs, "@default")
+            serial = default is not None and default.strip() == "autoincrement()"
+            if serial:
+                sql_type = "BIGSERIAL" if base_type == "BigInt" else "SERIAL"
+                default = None
+            elif default is not None:
+                default = default.strip()
+                if default == "now()":
+                    default = "CURRENT_TIMESTAMP"
+                elif default.startswith("dbgenerated("):
+                    default = default[len("dbgenerated(") : -1].strip().strip('"')
+                elif default in ("uuid()", "cuid()"):
+                    default = None  # generated by the Prisma client, not the database
+                elif default.startswith('"') or base_type in enums:
+                    default = "'" + default.strip('"').replace("'", "''") + "'"
+
+            if is_list:
+                sql_type += "[]"
+                catalog_type += "[]"
+
+            columns[column] = {
+                "sql_type": sql_type,
+                "catalog_type": catalog_type,
+                "not_null": not optional and not is_list,
+                "default": default,
+            }
+            if "@id" in attrs.split():
+                primary_key = [column]
+            if re.search(r"@unique\b", attrs):
+                uniques.append([column])
+
+        tables[table] = {
+            "columns": columns,
+            "primary_key": primary_key,
+            "uniques": uniques,
+            "foreign_keys": foreign_keys,
+        }
+
+    return {"tables": tables, "enums": enums}
+
+
+def introspect_schema(connection, schema: str = "public") -> dict:
+    """Read the actual tables, columns, enums, constraints and indexes of a schema"""
+    cursor = connection.cursor()
+    actual = {"tables": {}, "enums": {}, "constraints": set(), "indexes": set()}
+
+    cursor.execute(
+        """
+        SELECT c.relname, a.attname, format_type(a.atttypid, a.atttypmod), a.attnotnull
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_attribute a
+            ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+        WHERE n.nspname = %s AND c.relkind IN ('r', 'p')
+        ORDER BY c.relname, a.attnum
+    """,
+        (schema,),
+    )
+    for table, column, column_type, not_null in cursor.fetchall():
+        columns = actual["tables"].setdefault(table, {})
+        if column:
+            columns[column] = {
+                "catalog_type": column_type.replace('"', ""),
+                "not_null": not_null,
+            }
+
+    cursor.execute(
+        """
+        SELECT t.typname, array_agg(e.enumlabel ORDER BY e.enumsortorder)
+        FROM pg_type t
+        JOIN pg_enum e ON e.enumtypid = t.oid
+        JOIN pg_namespace n ON n.oid = t.typnamespace
+        WHERE n.nspname = %s
+        GROUP BY t.typname
+    """,
+        (schema,),
+    )
+    actual["enums"] = {name: list(labels) for name, labels in cursor.fetchall()}
+
+    cursor.execute(
+        """
+        SELECT con.conname
+        FROM pg_constraint con
+        JOIN pg_namespace n ON n.oid = con.connamespace
+        WHERE n.nspname = %s
+        UNION
+        SELECT indexname FROM pg_indexes WHERE schemaname = %s
+    """,
+        (schema, schema),
+    )
+    actual["constraints"] = {row[0] for row in cursor.fetchall()}
+
+    cursor.close()
+    return actual
+
+
+def _quote_columns(columns: list) -> str:
+    return ", ".join(f'"{column}"' for column in columns)
+
+
+def diff_schema(desired: dict, actual: dict) -> dict:
+    """Compute the minimal DDL that brings the actual schema up to the desired one.
+
+    Only additive repairs are emitted (missing enums, enum values, tables,
+    columns and constraints). Type and nullability changes and extra objects
+    are reported as unresolved instead of being altered or dropped: SET NOT
+    NULL fails or holds an exclusive lock on tables with live data.
+    """
+    statements = []
+    unresolved = []
+
+    for enum, labels in desired["enums"].items():
+        existing = actual["enums"].get(enum)
+        if existing is None:
+            values = ", ".join(f"'{label}'" for label in labels)
+            statements.append(f'CREATE TYPE "public"."{enum}" AS ENUM ({values})')
+            continue
+        for label in labels:
+            if label not in existing:
+                statements.append(
+                    f"ALTER TYPE \"public\".\"{enum}\" ADD VALUE IF NOT EXISTS '{label}'"
+                )
+
+    constraints = []
+    for table, spec in desired["tables"].items():
+        existing = actual["tables"].get(table)
+        if existing is None:
+            definitions = []
+            for column, col in spec["columns"].items():
+                definition = f'"{column}" {col["sql_type"]}'
+                if col["not_null"]:
+                    definition += " NOT NULL"
+                if col["default"] is not None:
+                    definition += f" DEFAULT {col['default']}"
+                definitions.append(definition)
+            if spec["primary_key"]:
+                definitions.append(
+                    f'CONSTRAINT "{table}_pkey" PRIMARY KEY ({_quote_columns(spec["primary_key"])})'
+                )
+            statements.append(
+                f'CREATE TABLE "public"."{table}" (' + ", ".join(definitions) + ")"
+            )
+        else:
+            for column, col in spec["columns"].items():
+                current = existing.get(column)
+                if current is None:
+                    definition = f'"{column}" {col["sql_type"]}'
+                    if col["default"] is not None:
+                        definition += f" DEFAULT {col['default']}"
+                    if col["not_null"]:
+                        definition += " NOT NULL"
+                    statements.append(
+                        f'ALTER TABLE "public"."{table}" ADD COLUMN {definition}'
+                    )
+                    continue
+                if current["catalog_type"] != col["catalog_type"]:
+                    unresolved.append(
+                        f"{table}.{column}: type is {current['catalog_type']}, "
+                        f"expected {col['catalog_type']}"
+                    )
+                if current["not_null"] != col["not_null"]:
+                    unresolved.append(
+                        f"{table}.{column}: is "
+                        f"{'NOT NULL' if current['not_null'] else 'nullable'}, expected "
+                        f"{'NOT NULL' if col['not_null'] else 'nullable'}"
+                    )
+            if spec["primary_key"] and f"{table}_pkey" not in actual["constraints"]:
+                constraints.append(
+                    f'ALTER TABLE "public"."{table}" ADD CONSTRAINT "{table}_pkey" '
+                    f'PRIMARY KEY ({_quote_columns(spec["primary_key"])})'
+                )
+
+        for columns in spec["uniques"]:
+            name = f"{table}_{'_'.join(columns)}_key"
+            if name not in actual["constraints"]:
+                constraints.append(
+                    f'CREATE UNIQUE INDEX "{name}" ON "public"."{table}"({_quote_columns(columns)})'
+                )
+
+        for fk in spec["foreign_keys"]:
+            name = f"{table}_{'_'.join(fk['columns'])}_fkey"
+            if name not in actual["constraints"]:
+                constraints.append(
+                    f'ALTER TABLE "public"."{table}" ADD CONSTRAINT "{name}" '
+                    f'FOREIGN KEY ({_quote_columns(fk["columns"])}) '
+                    f'REFERENCES "public"."{fk["references_table"]}"({_quote_columns(fk["references"])}) '
+                    f'ON DELETE {fk["on_delete"]} ON UPDATE {fk["on_update"]}'
+                )
+
+    # Constraints last, so every referenced table and column already exists
+    statements.extend(constraints)
+
+    for table in actual["tables"]:
+        if table not in desired["tables"]:
+            unresolved.append(f"{table}: table is not part of schema.prisma")
+
+    return {"statements": statements, "unresolved": unresolved}
+
+
+def repair_schema(connection, schema_path, apply: bool = True) -> dict:
+    """Diff a database against schema.prisma and optionally apply the DDL"""
+    with open(schema_path, "r", encoding="utf-8") as f:
+        desired = cached_parse(f.read(), parse_prisma_schema)
+
+    diff = diff_schema(desired, introspect_schema(connection))
+    logger.info(
+        f"Schema diff against {schema_path}: {len(diff['statements'])} statements, "
+        f"{len(diff['unresolved'])} unresolved"
+    )
+
+    result = {
+        "statements": diff["statements"],
+        "unresolved": diff["unresolved"],
+        "applied": 0,
+        "errors": [],
+    }
+    if not apply:
+        return result
+
+    cursor = connection.cursor()
+    for statement in diff["statements"]:
+        try:
+            logger.info(f"Applying: {statement}")
+            with observe_stage("statement"):
+                cursor.execute(statement)
+                connection.commit()
+            result["applied"] += 1
+        except Exception as e:
+            connection.rollback()
+            logger.error(f"Schema repair statement failed: {str(e)}")
+            result["errors"].append({"statement": statement, "error": str(e).strip()})
+    cursor.close()
+    return result
+
+
+def init_database_with_migrations(database_url: str, local_path: str) -> str:
+    """Initialize database using migration files with direct PostgreSQL connection.
+
+    Returns the SHA-256 of the applied migration file.
+    """
     try:
         # Connect to database
         connection = connect_to_database(database_url)
@@ -328,72 +1249,471 @@ def init_database_with_migrations(database_url: str, local_path: str):
         with open(migration_path, "r", encoding="utf-8") as f:
             migration_sql = f.read()
 
+        migration_sha = hashlib.sha256(migration_sql.encode("utf-8")).hexdigest()
         logger.info(f"Read migration file: {migration_path}")
         logger.info(f"Migration content length: {len(migration_sql)} characters")
+        logger.info(f"Migration SHA: {migration_sha}")
 
         # Show first few lines for debugging
         first_lines = migration_sql.split("\n")[:10]
         logger.info(f"First 10 lines of migration:\n" + "\n".join(first_lines))
 
-        # Execute migration
-        execute_migration_sql(connection, migration_sql)
+        # Already initialized databases are repaired from schema.prisma with
+        # the minimal DDL instead of replaying the whole migration
+        schema_path = Path(local_path) / "prisma" / "schema.prisma"
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_tables WHERE schemaname = 'public')"
+        )
+        initialized = cursor.fetchone()[0]
+        cursor.close()
+
+        if initialized and schema_path.exists():
+            logger.info("Database already initialized, repairing drift from schema.prisma")
+            repair = repair_schema(connection, schema_path)
+            logger.info(
+                f"Schema repair applied {repair['applied']}/{len(repair['statements'])} statements"
+            )
+            if repair["unresolved"]:
+                logger.warning(
+                    f"Schema drift needing a reviewed migration: {repair['unresolved']}"
+                )
+        else:
+            # Execute migration
+            execute_migration_sql(connection, migration_sql)
 
         # Close connection
         connection.close()
         logger.info("Database migration completed successfully")
+        return migration_sha
 
     except Exception as e:
         logger.error(f"Error initializing database: {str(e)}")
         raise
 
 
-def trigger_github_workflow(gh_pat, tenant_id, branch_name, workflow_inputs):
-    """Trigger GitHub Actions workflow for tenant deployment"""
+# Checkouts of the migration bundle (the directories
+# init_database_with_migrations reads from main), reused by clone_repository
+# until main moves. Each checkout is keyed by its commit and never modified;
+# it is deleted once no token refers to it and no copy is reading it. A token
+# may only use a checkout after git ls-remote succeeded with that token, which
+# is re-checked at most every MIGRATION_BUNDLE_TTL_SECONDS (0 checks on every
+# request).
+MIGRATION_BUNDLE_DIRS = ["prisma", "database", "sql", "migrations"]
+MIGRATION_BUNDLE_TTL_SECONDS = float(os.environ.get("MIGRATION_BUNDLE_TTL_SECONDS", "300"))
+MIGRATION_BUNDLE_MAX_TOKENS = 16  # tokens whose access check is remembered
+_migration_bundle_lock = threading.Lock()
+_migration_bundles = {}  # commit -> path, readers
+_migration_bundle_access = {}  # PAT digest -> commit, checked_at
+_migration_bundle_fetches = {}  # PAT digest -> fetch in flight
+
+
+def _repository_url(gh_pat) -> str:
+    if gh_pat:
+        return REPO_URL.replace("https://", f"https://{gh_pat}@")
+    return REPO_URL
+
+
+def _unused_migration_bundles() -> list:
+    """Forget checkouts nobody refers to; caller must hold _migration_bundle_lock"""
+    referenced = {access["commit"] for access in _migration_bundle_access.values()}
+    unused = [
+        commit
+        for commit, bundle in _migration_bundles.items()
+        if commit not in referenced and bundle["readers"] == 0
+    ]
+    return [_migration_bundles.pop(commit)["path"] for commit in unused]
+
+
+def fetch_migration_bundle(gh_pat) -> str:
+    """Check main with gh_pat and check it out unless that commit is cached"""
+    remote = run_command(f"git ls-remote {_repository_url(gh_pat)} refs/heads/main")
+    if not remote:
+        raise Exception("main branch not found in the app repository")
+    with _migration_bundle_lock:
+        if remote.split()[0] in _migration_bundles:
+            record_cache_lookup("migration_bundle", True)
+            return remote.split()[0]
+    record_cache_lookup("migration_bundle", False)
+
+    path = tempfile.mkdtemp(prefix="migration-bundle-")
+    try:
+        run_command(f"git clone --depth 1 --branch main {_repository_url(gh_pat)} {path}")
+        # main may have moved since ls-remote; key by what was checked out
+        commit = run_command("git rev-parse HEAD", cwd=path).strip()
+        for entry in os.listdir(path):
+            if entry not in MIGRATION_BUNDLE_DIRS:
+                entry_path = os.path.join(path, entry)
+                if os.path.isdir(entry_path):
+                    shutil.rmtree(entry_path, ignore_errors=True)
+                else:
+                    os.remove(entry_path)
+        # Parse ahead of time so the first migration finds it cached
+        for source in Path(path, "prisma").rglob("migration.sql"):
+            cached_parse(source.read_text(encoding="utf-8"), split_sql_statements)
+        schema_path = Path(path, "prisma", "schema.prisma")
+        if schema_path.exists():
+            cached_parse(schema_path.read_text(encoding="utf-8"), parse_prisma_schema)
+    except Exception:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+
+    with _migration_bundle_lock:
+        duplicate = commit in _migration_bundles  # fetched with another token
+        if not duplicate:
+            _migration_bundles[commit] = {"path": path, "readers": 0}
+    if duplicate:
+        shutil.rmtree(path, ignore_errors=True)
+    logger.info(f"Fetched migration bundle at {commit}")
+    return commit
+
+
+def refresh_migration_bundle(gh_pat) -> str:
+    """Return the commit of the checkout gh_pat may use, fetching if needed.
+
+    The fetch runs outside _migration_bundle_lock; concurrent requests with
+    the same token wait for the one in flight instead of starting their own.
+    """
+    key = hashlib.sha256((gh_pat or "").encode("utf-8")).hexdigest()
+    with _migration_bundle_lock:
+        access = _migration_bundle_access.get(key)
+        if (
+            access
+            and access["commit"] in _migration_bundles
+            and time.monotonic() - access["checked_at"] < MIGRATION_BUNDLE_TTL_SECONDS
+        ):
+            record_cache_lookup("migration_bundle", True)
+            return access["commit"]
+        fetch = _migration_bundle_fetches.get(key)
+        is_owner = fetch is None
+        if is_owner:
+            fetch = {"done": threading.Event(), "commit": None, "error": None}
+            _migration_bundle_fetches[key] = fetch
+
+    if not is_owner:
+        fetch["done"].wait()
+        if fetch["error"]:
+            raise Exception(fetch["error"])
+        return fetch["commit"]
+
+    unused = []
+    try:
+        fetch["commit"] = fetch_migration_bundle(gh_pat)
+        with _migration_bundle_lock:
+            _migration_bundle_access[key] = {
+                "commit": fetch["commit"],
+                "checked_at": time.monotonic(),
+            }
+            while len(_migration_bundle_access) > MIGRATION_BUNDLE_MAX_TOKENS:
+                oldest = min(
+                    _migration_bundle_access,
+                    key=lambda k: _migration_bundle_access[k]["checked_at"],
+                )
+                del _migration_bundle_access[oldest]
+            unused = _unused_migration_bundles()
+    except Exception as e:
+        fetch["error"] = str(e)
+        raise
+    finally:
+        with _migration_bundle_lock:
+            del _migration_bundle_fetches[key]
+        fetch["done"].set()
+
+    for path in unused:
+        shutil.rmtree(path, ignore_errors=True)
+    return fetch["commit"]
+
+
+def clone_repository(gh_pat, local_path: str):
+    """Clone the main branch of the app repository into local_path"""
+    with observe_stage("clone"):
+        try:
+            commit = refresh_migration_bundle(gh_pat)
+            with _migration_bundle_lock:
+                bundle = _migration_bundles[commit]
+                bundle["readers"] += 1  # keeps the checkout until the copy is done
+            try:
+                shutil.copytree(bundle["path"], local_path, dirs_exist_ok=True)
+            finally:
+                with _migration_bundle_lock:
+                    bundle["readers"] -= 1
+                    unused = _unused_migration_bundles()
+                for path in unused:
+                    shutil.rmtree(path, ignore_errors=True)
+            return
+        except Exception as e:
+            logger.warning(f"Migration bundle unavailable, cloning instead: {str(e)}")
+            shutil.rmtree(local_path, ignore_errors=True)
+
+        run_command(f"git clone --branch main {_repository_url(gh_pat)} {local_path}")
+
+
+def resolve_deploy_image(deploy_mode: str, tenant_id: str) -> str:
+    """Return the image a tenant is deployed from for the given deploy mode"""
+    if deploy_mode not in DEPLOY_MODES:
+        raise ValueError(
+            f"Invalid deploy_mode '{deploy_mode}', expected one of: {', '.join(DEPLOY_MODES)}"
+        )
+    if deploy_mode == "per_tenant":
+        return f"ghcr.io/keydyy/{IMAGE_NAME}-{tenant_id}:latest"
+
+    shared_image = os.environ.get("SHARED_IMAGE")
+    if not shared_image:
+        raise ValueError("deploy_mode 'shared' requires the SHARED_IMAGE setting")
+    if "@sha256:" not in shared_image:
+        raise ValueError(f"SHARED_IMAGE must be pinned by digest, got {shared_image}")
+    return shared_image
+
+
+# One pooled session keeps GitHub TLS connections open between requests
+_github_session = requests.Session()
+_github_session.mount(
+    "https://", HTTPAdapter(pool_maxsize=DEPENDENCY_LIMITS["github"])
+)
+
+
+def github_request(method: str, url: str, **kwargs):
+    """Send a GitHub API request, recording latency, status and throttling"""
+    kwargs.setdefault("timeout", (5, GITHUB_TIMEOUT_SECONDS))
+    with observe_stage("github"), dependency_call(
+        "github", failures=(requests.RequestException,)
+    ) as call:
+        response = _github_session.request(method, url, **kwargs)
+        throttled = response.status_code == 429 or (
+            response.status_code == 403
+            and response.headers.get("X-RateLimit-Remaining") == "0"
+        )
+        if throttled or response.status_code >= 500:
+            call["error"] = f"HTTP {response.status_code}"
+    inc_counter("github_requests_total", {"status": str(response.status_code)})
+    if throttled:
+        inc_counter("github_throttled_total")
+        logger.warning(f"GitHub API rate limit hit: {response.status_code} for {url}")
+    return response
+
+
+# Workflow IDs by name; they only change if a workflow file is recreated
+WORKFLOW_NAMES = ["Build & Deploy Tenant", "Delete Tenant"]
+WORKFLOW_ID_TTL_SECONDS = float(os.environ.get("WORKFLOW_ID_TTL_SECONDS", "3600"))
+_workflow_ids_lock = threading.Lock()
+_workflow_ids = {}  # workflow name -> (workflow ID, resolved at)
+
+
+def resolve_workflow_ids(gh_pat) -> dict:
+    """Fetch the workflow list and cache the ID of every workflow by name"""
+    headers = {
+        "Authorization": f"token {gh_pat}",
+        "Accept": "application/vnd.github.v3+json",
+    }
+    workflow_url = f"{GITHUB_API_URL}/repos/keydyy/quiz_app_ct/actions/workflows"
+    logger.info(f"Fetching workflows from: {workflow_url}")
+
+    response = github_request("GET", workflow_url, headers=headers)
+    if response.status_code != 200:
+        raise Exception(
+            f"Failed to get workflows: {response.status_code} - {response.text}"
+        )
+
+    workflow_ids = {w["name"]: w["id"] for w in response.json()["workflows"]}
+    resolved_at = time.monotonic()
+    with _workflow_ids_lock:
+        _workflow_ids.clear()
+        _workflow_ids.update(
+            {name: (workflow_id, resolved_at) for name, workflow_id in workflow_ids.items()}
+        )
+    return workflow_ids
+
+
+def get_workflow_id(gh_pat, workflow_name: str, refresh: bool = False):
+    """Return the ID of a workflow, from the cache when it is fresh"""
+    with _workflow_ids_lock:
+        cached = _workflow_ids.get(workflow_name)
+    hit = bool(
+        cached
+        and not refresh
+        and time.monotonic() - cached[1] < WORKFLOW_ID_TTL_SECONDS
+    )
+    record_cache_lookup("workflow_ids", hit)
+    if hit:
+        return cached[0]
+
+    workflow_ids = resolve_workflow_ids(gh_pat)
+    if workflow_name not in workflow_ids:
+        raise Exception(
+            f"{workflow_name} workflow not found. Available workflows: {list(workflow_ids)}"
+        )
+    return workflow_ids[workflow_name]
+
+
+def dispatch_workflow(gh_pat, workflow_name: str, workflow_inputs: dict):
+    """Dispatch a GitHub Actions workflow by name and return its workflow ID"""
     try:
         headers = {
             "Authorization": f"token {gh_pat}",
             "Accept": "application/vnd.github.v3+json",
         }
+        payload = {"ref": "main", "inputs": workflow_inputs}  # Always use main branch
 
-        # Get the workflow ID for "Build & Deploy Tenant"
-        workflow_url = f"{GITHUB_API_URL}/repos/keydyy/quiz_app_ct/actions/workflows"
-        logger.info(f"Fetching workflows from: {workflow_url}")
+        workflow_id = get_workflow_id(gh_pat, workflow_name)
+        for attempt in range(2):
+            # Trigger the workflow with inputs using main branch
+            trigger_url = f"{GITHUB_API_URL}/repos/keydyy/quiz_app_ct/actions/workflows/{workflow_id}/dispatches"
+
+            logger.info(f"Triggering workflow at: {trigger_url}")
+            response = github_request("POST", trigger_url, headers=headers, json=payload)
+            if response.status_code == 404 and attempt == 0:
+                # The cached ID is stale, e.g. the workflow file was recreated
+                workflow_id = get_workflow_id(gh_pat, workflow_name, refresh=True)
+                continue
+            if response.status_code != 204:
+                raise Exception(
+                    f"Failed to trigger workflow: {response.status_code} - {response.text}"
+                )
+            break
 
-        response = requests.get(workflow_url, headers=headers, timeout=30)
-        if response.status_code != 200:
-            raise Exception(
-                f"Failed to get workflows: {response.status_code} - {response.text}"
-            )
+        return workflow_id
+
+    except requests.RequestException as e:
+        raise Exception(f"GitHub API request failed: {str(e)}")
 
-        workflows = response.json()["workflows"]
-        build_workflow = next(
-            (w for w in workflows if w["name"] == "Build & Deploy Tenant"), None
+
+# Dispatch coalescing: tenant requests for the same workflow arriving within
+# DISPATCH_WINDOW_SECONDS (or until DISPATCH_BATCH_SIZE is reached) are sent as
+# a single dispatch whose "tenants" input the workflow runs as a matrix.
+DISPATCH_WINDOW_SECONDS = float(os.environ.get("DISPATCH_WINDOW_SECONDS", "1.0"))
+DISPATCH_BATCH_SIZE = int(os.environ.get("DISPATCH_BATCH_SIZE", "20"))
+DISPATCH_STATUS_TTL_SECONDS = int(os.environ.get("DISPATCH_STATUS_TTL_SECONDS", "86400"))
+DISPATCH_STATUS_MAX_RECORDS = 1000  # latest dispatch records kept per instance
+
+_dispatch_lock = threading.Lock()
+_dispatch_batches = {}  # (workflow name, PAT hash) -> open batch
+_dispatch_status = {}  # (workflow name, tenant ID) -> latest dispatch result, oldest first
+_dispatch_batch_ids = itertools.count(1)
+
+
+def _close_dispatch_batch(key, batch):
+    """Stop a batch from accepting entries; caller must hold _dispatch_lock"""
+    if _dispatch_batches.get(key) is batch:
+        del _dispatch_batches[key]
+    batch["full"].set()
+
+
+def _evict_dispatch_status():
+    """Drop expired and surplus dispatch records; caller must hold _dispatch_lock"""
+    now = time.time()
+    surplus = len(_dispatch_status) - DISPATCH_STATUS_MAX_RECORDS
+    for i, key in enumerate(list(_dispatch_status)):
+        age = now - _dispatch_status[key]["dispatched_at"]
+        if i >= surplus and age <= DISPATCH_STATUS_TTL_SECONDS:
+            break  # records are kept oldest first
+        del _dispatch_status[key]
+
+
+def new_dispatch_batch() -> dict:
+    return {
+        "id": f"{int(time.time())}-{next(_dispatch_batch_ids)}",
+        "entries": [],
+        "records": {},  # tenant ID -> dispatch record
+        "full": threading.Event(),
+        "done": threading.Event(),
+        "workflow_id": None,
+        "error": None,
+    }
+
+
+def send_dispatch_batch(gh_pat, workflow_name: str, batch: dict):
+    """Dispatch once for every (tenant ID, inputs) entry and record each status"""
+    entries = [entry_inputs for _, entry_inputs in batch["entries"]]
+    try:
+        if len(entries) == 1:
+            workflow_inputs = entries[0]
+        else:
+            workflow_inputs = {"tenants": json.dumps(entries)}
+        logger.info(
+            f"Dispatching {workflow_name} for {len(entries)} tenant(s) in batch {batch['id']}"
         )
-        if not build_workflow:
-            available_workflows = [w["name"] for w in workflows]
-            raise Exception(
-                f"Build & Deploy Tenant workflow not found. Available workflows: {available_workflows}"
-            )
+        batch["workflow_id"] = dispatch_workflow(gh_pat, workflow_name, workflow_inputs)
+    except Exception as e:
+        batch["error"] = str(e)
+        batch["unavailable"] = isinstance(e, DependencyUnavailable)
+
+    for entry_tenant, _ in batch["entries"]:
+        batch["records"][entry_tenant] = {
+            "tenant_id": entry_tenant,
+            "workflow": workflow_name,
+            "batch_id": batch["id"],
+            "batch_size": len(batch["entries"]),
+            "workflow_id": batch["workflow_id"],
+            "status": "failed" if batch["error"] else "dispatched",
+            "error": batch["error"],
+            "dispatched_at": time.time(),
+        }
+    with _dispatch_lock:
+        for entry_tenant, record in batch["records"].items():
+            # Re-inserted so the dict stays ordered by dispatch time
+            _dispatch_status.pop((workflow_name, entry_tenant), None)
+            _dispatch_status[(workflow_name, entry_tenant)] = record
+        _evict_dispatch_status()
+    batch["done"].set()
+
+
+def coalesced_dispatch(gh_pat, workflow_name: str, tenant_id: str, inputs: dict) -> dict:
+    """Queue a tenant for a coalesced workflow dispatch and wait for the result.
+
+    The first request of a batch becomes its leader: it waits for the window
+    to pass or the batch to fill up, then dispatches once for every tenant.
+    A tenant queued twice in the same batch keeps a single entry with the
+    latest inputs, so two matrix jobs never race on its Terraform state.
+    Returns the per-tenant dispatch record; raises if the dispatch failed.
+    """
+    key = (workflow_name, hashlib.sha256(gh_pat.encode("utf-8")).hexdigest())
+    with _dispatch_lock:
+        batch = _dispatch_batches.get(key)
+        is_leader = batch is None
+        if is_leader:
+            batch = new_dispatch_batch()
+            _dispatch_batches[key] = batch
+        queued = [t for t, _ in batch["entries"]]
+        if tenant_id in queued:
+            batch["entries"][queued.index(tenant_id)] = (tenant_id, inputs)
+        else:
+            batch["entries"].append((tenant_id, inputs))
+        if len(batch["entries"]) >= DISPATCH_BATCH_SIZE:
+            _close_dispatch_batch(key, batch)
 
-        # Trigger the workflow with inputs using main branch
-        trigger_url = f"{GITHUB_API_URL}/repos/keydyy/quiz_app_ct/actions/workflows/{build_workflow['id']}/dispatches"
-        payload = {"ref": "main", "inputs": workflow_inputs}  # Always use main branch
+    if is_leader:
+        batch["full"].wait(DISPATCH_WINDOW_SECONDS)
+        with _dispatch_lock:
+            _close_dispatch_batch(key, batch)
+        send_dispatch_batch(gh_pat, workflow_name, batch)
+    else:
+        batch["done"].wait()
 
-        logger.info(f"Triggering workflow at: {trigger_url}")
-        response = requests.post(trigger_url, headers=headers, json=payload, timeout=30)
-        if response.status_code != 204:
-            raise Exception(
-                f"Failed to trigger workflow: {response.status_code} - {response.text}"
-            )
+    if batch["error"]:
+        if batch.get("unavailable"):
+            raise DependencyUnavailable(batch["error"])
+        raise Exception(batch["error"])
+    return batch["records"][tenant_id]
 
-        return build_workflow["id"]
 
-    except requests.RequestException as e:
-        raise Exception(f"GitHub API request failed: {str(e)}")
+def get_dispatch_status(workflow_name: str, tenant_id: str):
+    """Return the latest dispatch record of a tenant for a workflow, if any"""
+    with _dispatch_lock:
+        return _dispatch_status.get((workflow_name, tenant_id))
+
+
+def trigger_github_workflow(gh_pat, tenant_id, branch_name, workflow_inputs):
+    """Trigger GitHub Actions workflow for tenant deployment"""
+    return coalesced_dispatch(
+        gh_pat, "Build & Deploy Tenant", tenant_id, workflow_inputs
+    )["workflow_id"]
 
 
-def get_container_url(gh_pat: str, workflow_run_id: str) -> str:
-    """Get the container app URL from the GitHub Actions workflow run"""
+def get_container_url(gh_pat: str, workflow_run_id: str, tenant_id: str = None) -> str:
+    """Get the container app URL from the GitHub Actions workflow run
+
+    Batched runs name each matrix job "build_and_deploy (<tenant_id>)".
+    """
     try:
         headers = {
             "Authorization": f"token {gh_pat}",
@@ -404,7 +1724,7 @@ def get_container_url(gh_pat: str, workflow_run_id: str) -> str:
         run_url = (
             f"{GITHUB_API_URL}/repos/keydyy/quiz_app_ct/actions/runs/{workflow_run_id}"
         )
-        response = requests.get(run_url, headers=headers, timeout=30)
+        response = github_request("GET", run_url, headers=headers)
         if response.status_code != 200:
             raise Exception(
                 f"Failed to get workflow run: {response.status_code} - {response.text}"
@@ -412,7 +1732,7 @@ def get_container_url(gh_pat: str, workflow_run_id: str) -> str:
 
         # Get the jobs for this run
         jobs_url = f"{run_url}/jobs"
-        response = requests.get(jobs_url, headers=headers, timeout=30)
+        response = github_request("GET", jobs_url, headers=headers)
         if response.status_code != 200:
             raise Exception(
                 f"Failed to get workflow jobs: {response.status_code} - {response.text}"
@@ -422,16 +1742,15 @@ def get_container_url(gh_pat: str, workflow_run_id: str) -> str:
         if not jobs:
             return "URL not available yet"
 
-        # Get the build_and_deploy job
-        build_job = next(
-            (job for job in jobs if job["name"] == "build_and_deploy"), None
-        )
+        # Get the build_and_deploy job (or the tenant's job of a batched run)
+        job_names = {"build_and_deploy", f"build_and_deploy ({tenant_id})"}
+        build_job = next((job for job in jobs if job["name"] in job_names), None)
         if not build_job:
             return "URL not available yet"
 
         # Get the job steps
         steps_url = f"{GITHUB_API_URL}/repos/keydyy/quiz_app_ct/actions/jobs/{build_job['id']}/steps"
-        response = requests.get(steps_url, headers=headers, timeout=30)
+        response = github_request("GET", steps_url, headers=headers)
         if response.status_code != 200:
             raise Exception(
                 f"Failed to get job steps: {response.status_code} - {response.text}"
@@ -447,7 +1766,7 @@ def get_container_url(gh_pat: str, workflow_run_id: str) -> str:
 
         # Get the step logs
         logs_url = f"{GITHUB_API_URL}/repos/keydyy/quiz_app_ct/actions/jobs/{build_job['id']}/steps/{url_step['number']}/logs"
-        response = requests.get(logs_url, headers=headers, timeout=30)
+        response = github_request("GET", logs_url, headers=headers)
         if response.status_code != 200:
             raise Exception(
                 f"Failed to get step logs: {response.status_code} - {response.text}"
@@ -468,43 +1787,616 @@ def get_container_url(gh_pat: str, workflow_run_id: str) -> str:
         return "Error retrieving URL"
 
 
-@app.function_name(name="CreateTenant")
-@app.route(route="create-tenant", auth_level=func.AuthLevel.FUNCTION)
-def main(req: func.HttpRequest) -> func.HttpResponse:
-    local_path = None
+def describe_public_tables(connection) -> dict:
+    """Return column information for every table in the public schema"""
+    cursor = connection.cursor()
+
+    # Get all tables
+    cursor.execute(
+        """
+        SELECT table_name, table_type 
+        FROM information_schema.tables 
+        WHERE table_schema = 'public' 
+        ORDER BY table_name
+    """
+    )
+    tables = cursor.fetchall()
+
+    # Get table information
+    table_info = {}
+    for table_name, table_type in tables:
+        cursor.execute(
+            """
+            SELECT column_name, data_type, is_nullable, column_default
+            FROM information_schema.columns 
+            WHERE table_schema = 'public' AND table_name = %s
+            ORDER BY ordinal_position
+        """,
+            (table_name,),
+        )
+        columns = cursor.fetchall()
+        table_info[table_name] = {
+            "type": table_type,
+            "columns": [
+                {
+                    "name": col[0],
+                    "type": col[1],
+                    "nullable": col[2],
+                    "default": col[3],
+                }
+                for col in columns
+            ],
+        }
+
+    cursor.close()
+    return table_info
+
+
+# Deterministic description of a schema's catalog, hashed server-side. Every
+# table, column, enum, index and constraint contributes one line, sorted
+# bytewise (COLLATE "C") so the hash does not depend on the database locale
+# (%% escapes the format() placeholders from psycopg2). The optional
+# performance profile indexes (*_perf_idx) are not part of the schema contract.
+SCHEMA_FINGERPRINT_SQL = """
+    SELECT md5(string_agg(item, E'\\n' ORDER BY item COLLATE "C")), count(*)
+    FROM (
+        SELECT format('table %%s %%s', c.relname, c.relkind) AS item
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %(schema)s AND c.relkind IN ('r', 'p', 'v', 'm')
+        UNION ALL
+        SELECT format(
+            'column %%s.%%s %%s %%s %%s',
+            c.relname, a.attname, format_type(a.atttypid, a.atttypmod),
+            a.attnotnull, pg_get_expr(d.adbin, d.adrelid)
+        )
+        FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+        WHERE n.nspname = %(schema)s AND c.relkind IN ('r', 'p', 'v', 'm')
+          AND a.attnum > 0 AND NOT a.attisdropped
+        UNION ALL
+        SELECT format(
+            'enum %%s %%s', t.typname,
+            string_agg(e.enumlabel, ',' ORDER BY e.enumsortorder)
+        )
+        FROM pg_type t
+        JOIN pg_enum e ON e.enumtypid = t.oid
+        JOIN pg_namespace n ON n.oid = t.typnamespace
+        WHERE n.nspname = %(schema)s
+        GROUP BY t.typname
+        UNION ALL
+        SELECT format('index %%s', pg_get_indexdef(i.indexrelid))
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %(schema)s AND c.relname NOT LIKE '%%\\_perf\\_idx'
+        UNION ALL
+        SELECT format(
+            'constraint %%s %%s %%s', cl.relname, con.conname,
+            pg_get_constraintdef(con.oid)
+        )
+        FROM pg_constraint con
+        JOIN pg_class cl ON cl.oid = con.conrelid
+        JOIN pg_namespace n ON n.oid = con.connamespace
+        WHERE n.nspname = %(schema)s
+    ) catalog
+"""
+
+
+def compute_schema_fingerprint(connection, schema: str = "public") -> dict:
+    """Compute the schema fingerprint in a single catalog query"""
+    cursor = connection.cursor()
+    cursor.execute(SCHEMA_FINGERPRINT_SQL, {"schema": schema})
+    fingerprint, objects = cursor.fetchone()
+    cursor.close()
+    return {"fingerprint": fingerprint, "objects": objects}
+
+
+def verify_schema_fingerprint(connection, migration_sha: str = None) -> dict:
+    """Compare the live schema fingerprint with the one expected for a migration.
+
+    The expected fingerprint comes from the SCHEMA_FINGERPRINT_<sha prefix> app
+    setting, produced from a clean migration (e.g. in CI). Without it there is
+    no reference to compare against and matches is None.
+    """
+    result = compute_schema_fingerprint(connection)
+    result["migration_sha"] = migration_sha
+    result["expected"] = None
+    result["matches"] = None
+
+    if migration_sha:
+        key = f"SCHEMA_FINGERPRINT_{migration_sha[:16]}"
+        result["expected_setting"] = key
+        expected = os.environ.get(key)
+        if expected:
+            result["expected"] = expected
+            result["matches"] = expected == result["fingerprint"]
+        else:
+            logger.warning(
+                f"{key} is not configured, schema fingerprint cannot be verified"
+            )
+
+    logger.info(
+        f"Schema fingerprint {result['fingerprint']} ({result['objects']} objects), "
+        f"matches expected: {result['matches']}"
+    )
+    return result
+
+
+# Indexes of the optional performance profile, each with the hot query it
+# supports. Names end in _perf_idx so the schema fingerprint can skip them.
+PERFORMANCE_INDEXES = [
+    {
+        "name": "GameAnswers_game_id_question_id_perf_idx",
+        "table": "GameAnswers",
+        "columns": ["game_id", "question_id"],
+        "query": 'SELECT * FROM "public"."GameAnswers" WHERE game_id = %(uuid)s AND question_id = 1',
+    },
+    {
+        "name": "GameAnswers_user_id_game_id_perf_idx",
+        "table": "GameAnswers",
+        "columns": ["user_id", "game_id"],
+        "query": 'SELECT * FROM "public"."GameAnswers" WHERE user_id = %(uuid)s AND game_id = %(uuid)s',
+    },
+    {
+        "name": "GameInvitations_receiver_user_id_status_perf_idx",
+        "table": "GameInvitations",
+        "columns": ["receiver_user_id", "status"],
+        "query": 'SELECT * FROM "public"."GameInvitations" WHERE receiver_user_id = %(uuid)s AND status = \'Pending\'',
+    },
+    {
+        "name": "Questions_quiz_id_perf_idx",
+        "table": "Questions",
+        "columns": ["quiz_id"],
+        "query": 'SELECT * FROM "public"."Questions" WHERE quiz_id = 1',
+    },
+]
+
+
+def _plan_uses_index(plan: dict, index_name: str) -> bool:
+    """Check whether an EXPLAIN (FORMAT JSON) plan node tree scans an index"""
+    if plan.get("Index Name") == index_name:
+        return True
+    return any(_plan_uses_index(child, index_name) for child in plan.get("Plans", []))
+
+
+def apply_performance_profile(database_url: str) -> dict:
+    """Create the performance profile indexes and confirm the hot queries use them.
+
+    Indexes are built with CREATE INDEX CONCURRENTLY so live tenants keep
+    writing; invalid leftovers of an interrupted build are rebuilt. The check
+    runs EXPLAIN with sequential scans disabled, because small tables would
+    otherwise always be planned as a seq scan.
+    """
+    connection = connect_to_database(database_url)
+    connection.autocommit = True  # CONCURRENTLY cannot run inside a transaction
+    report = []
     try:
-        logger.info("Starting CreateTenant function")
+        cursor = connection.cursor()
+        for index in PERFORMANCE_INDEXES:
+            entry = {"index": index["name"], "table": index["table"]}
+            try:
+                cursor.execute(
+                    """
+                    SELECT i.indisvalid
+                    FROM pg_index i
+                    JOIN pg_class c ON c.oid = i.indexrelid
+                    JOIN pg_namespace n ON n.oid = c.relnamespace
+                    WHERE n.nspname = 'public' AND c.relname = %s
+                """,
+                    (index["name"],),
+                )
+                row = cursor.fetchone()
+                if row and not row[0]:
+                    logger.warning(f"Rebuilding invalid index {index['name']}")
+                    cursor.execute(
+                        f'DROP INDEX CONCURRENTLY IF EXISTS "public"."{index["name"]}"'
+                    )
+                    row = None
+
+                entry["created"] = row is None
+                if row is None:
+                    columns = ", ".join(f'"{c}"' for c in index["columns"])
+                    cursor.execute(
+                        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index["name"]}" '
+                        f'ON "public"."{index["table"]}" ({columns})'
+                    )
 
-        # Parse request
-        try:
-            data = req.get_json()
-            if not data:
-                return func.HttpResponse(
-                    json.dumps({"error": "No JSON data provided"}),
-                    status_code=400,
-                    mimetype="application/json",
+                cursor.execute("BEGIN")
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute(
+                    "EXPLAIN (FORMAT JSON) " + index["query"],
+                    {"uuid": "00000000-0000-0000-0000-000000000000"},
                 )
-        except Exception as e:
-            return func.HttpResponse(
-                json.dumps({"error": f"Invalid JSON: {str(e)}"}),
-                status_code=400,
-                mimetype="application/json",
+                plan = cursor.fetchone()[0][0]["Plan"]
+                cursor.execute("ROLLBACK")
+
+                entry["query_uses_index"] = _plan_uses_index(plan, index["name"])
+                entry["plan"] = plan["Node Type"]
+            except Exception as e:
+                if connection.get_transaction_status() != 0:
+                    cursor.execute("ROLLBACK")
+                logger.error(f"Performance index {index['name']} failed: {str(e)}")
+                entry["error"] = str(e).strip()
+            report.append(entry)
+        cursor.close()
+    finally:
+        connection.close()
+
+    logger.info(f"Performance profile applied: {report}")
+    return {
+        "indexes": report,
+        "verified": all(entry.get("query_uses_index") for entry in report),
+    }
+
+
+def provisioning_inputs_hash(*values) -> str:
+    """Hash the provisioning inputs so checkpoints are only reused for the same request"""
+    digest = hashlib.sha256()
+    for value in values:
+        digest.update(str(value).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+# Lives outside the public schema so it never shows up in the schema
+# fingerprint or the schema.prisma diff.
+CHECKPOINTS_DDL = [
+    "CREATE SCHEMA IF NOT EXISTS quiz_maintenance",
+    """
+    CREATE TABLE IF NOT EXISTS quiz_maintenance.provisioning_checkpoints (
+        tenant_id TEXT NOT NULL,
+        inputs_hash TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        result JSONB NOT NULL DEFAULT '{}',
+        completed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (tenant_id, inputs_hash, stage)
+    )
+    """,
+]
+
+
+def load_checkpoints(database_url: str, tenant_id: str, inputs_hash: str) -> dict:
+    """Load completed provisioning stages of a tenant from its database.
+
+    Checkpoints recorded for different workflow inputs (Supabase settings,
+    database_url, container limits or image) are ignored, because their
+    stages were completed for another request. The gh_pat is not part of
+    the inputs: the stages do not depend on which token ran them.
+    An unreachable database or a missing table means no checkpoints.
+    """
+    try:
+        with pooled_connection(database_url) as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                "SELECT to_regclass('quiz_maintenance.provisioning_checkpoints')"
+            )
+            if cursor.fetchone()[0] is None:
+                return {}
+            cursor.execute(
+                """
+                SELECT stage, result, extract(epoch FROM completed_at)
+                FROM quiz_maintenance.provisioning_checkpoints
+                WHERE tenant_id = %s AND inputs_hash = %s
+                """,
+                (tenant_id, inputs_hash),
             )
+            rows = cursor.fetchall()
+            cursor.close()
+    except Exception as e:
+        logger.warning(f"Could not load provisioning checkpoints for {tenant_id}: {str(e)}")
+        return {}
 
-        # Extract and validate parameters
-        tenant_id = data.get("tenant_id")
-        supabase_url = data.get("supabase_url")
-        supabase_key = data.get("supabase_anon_key")
-        database_url = data.get("database_url")
-        gh_pat = data.get("gh_pat")
+    return {
+        stage: {"completed_at": float(completed_at), "result": result}
+        for stage, result, completed_at in rows
+    }
 
-        # Optional parameters for container configuration
-        cpu_limit = data.get("cpu_limit", "0.5")
-        memory_limit = data.get("memory_limit", "1Gi")
-        min_replicas = data.get("min_replicas", 1)
-        max_replicas = data.get("max_replicas", 3)
 
-        logger.info(f"Processing tenant: {tenant_id}")
+def save_checkpoint(
+    database_url: str, tenant_id: str, inputs_hash: str, stage: str, result=None
+):
+    """Record a completed provisioning stage in the tenant database.
+
+    Checkpoints of other inputs are removed at the same time. A failure is
+    only logged: the stage then simply runs again on the next attempt.
+    """
+    try:
+        with pooled_connection(database_url) as connection:
+            cursor = connection.cursor()
+            for statement in CHECKPOINTS_DDL:
+                cursor.execute(statement)
+            cursor.execute(
+                """
+                DELETE FROM quiz_maintenance.provisioning_checkpoints
+                WHERE tenant_id = %s AND inputs_hash <> %s
+                """,
+                (tenant_id, inputs_hash),
+            )
+            if cursor.rowcount:
+                logger.info(f"Provisioning inputs changed for {tenant_id}, starting over")
+            cursor.execute(
+                """
+                INSERT INTO quiz_maintenance.provisioning_checkpoints
+                    (tenant_id, inputs_hash, stage, result)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (tenant_id, inputs_hash, stage)
+                DO UPDATE SET result = EXCLUDED.result, completed_at = now()
+                """,
+                (tenant_id, inputs_hash, stage, json.dumps(result or {})),
+            )
+            connection.commit()
+            cursor.close()
+        logger.info(f"Checkpoint saved for tenant {tenant_id}: {stage}")
+    except Exception as e:
+        logger.warning(f"Could not save checkpoint {stage} for {tenant_id}: {str(e)}")
+
+
+def clear_checkpoints(tenant_id: str, database_url: str = None):
+    """Forget all provisioning checkpoints of a tenant"""
+    database_url = database_url or os.environ.get(f"DATABASE_URL_{tenant_id}")
+    if not database_url:
+        logger.warning(f"No database_url for {tenant_id}, checkpoints not cleared")
+        return
+    try:
+        with pooled_connection(database_url) as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                "SELECT to_regclass('quiz_maintenance.provisioning_checkpoints')"
+            )
+            if cursor.fetchone()[0] is not None:
+                cursor.execute(
+                    "DELETE FROM quiz_maintenance.provisioning_checkpoints WHERE tenant_id = %s",
+                    (tenant_id,),
+                )
+                connection.commit()
+            cursor.close()
+    except Exception as e:
+        logger.warning(f"Could not clear checkpoints for {tenant_id}: {str(e)}")
+
+
+# Idempotency-Key -> CreateTenant job; duplicates wait on or replay the same job.
+# Finished jobs expire after IDEMPOTENCY_TTL_SECONDS and at most
+# IDEMPOTENCY_MAX_JOBS are kept; a retry after that resumes from checkpoints.
+_idempotency_lock = threading.Lock()
+_idempotency_jobs = {}
+
+
+def _evict_idempotent_jobs():
+    """Drop expired and surplus finished jobs; caller must hold _idempotency_lock"""
+    now = time.monotonic()
+    finished = [
+        (job["finished_at"], key)
+        for key, job in _idempotency_jobs.items()
+        if job["finished_at"] is not None
+    ]
+    finished.sort()
+    surplus = len(finished) - IDEMPOTENCY_MAX_JOBS
+    for i, (finished_at, key) in enumerate(finished):
+        if i < surplus or now - finished_at > IDEMPOTENCY_TTL_SECONDS:
+            del _idempotency_jobs[key]
+
+
+def begin_idempotent_job(idempotency_key: str, tenant_id: str):
+    """Register a job for an idempotency key.
+
+    Returns (job, is_owner). Only the owner runs the job; every other caller
+    with the same key waits for the owner's result.
+    """
+    with _idempotency_lock:
+        _evict_idempotent_jobs()
+        job = _idempotency_jobs.get(idempotency_key)
+        record_cache_lookup("idempotency", bool(job and job["status"] != "failed"))
+        if job and job["status"] != "failed":
+            return job, False
+        job = {
+            "tenant_id": tenant_id,
+            "status": "in_progress",
+            "done": threading.Event(),
+            "body": None,
+            "status_code": None,
+            "finished_at": None,
+        }
+        _idempotency_jobs[idempotency_key] = job
+        return job, True
+
+
+def finish_idempotent_job(job: dict, body: dict, status_code: int):
+    """Store the job result and release every waiting duplicate"""
+    job["body"] = body
+    job["status_code"] = status_code
+    # Failed jobs may be retried with the same key; they resume from checkpoints
+    job["status"] = "completed" if status_code < 500 else "failed"
+    with _idempotency_lock:
+        job["finished_at"] = time.monotonic()
+    job["done"].set()
+
+
+def run_provisioning_pipeline(
+    tenant_id,
+    database_url,
+    gh_pat,
+    workflow_inputs,
+    inputs_hash,
+    include_table_info=False,
+    performance_profile=False,
+) -> tuple:
+    """Run the CreateTenant stages, skipping any that are already checkpointed.
+
+    Returns (response_body, status_code).
+    """
+    stages = load_checkpoints(database_url, tenant_id, inputs_hash)
+    run_stages = [
+        s
+        for s in PROVISIONING_STAGES
+        if s not in OPTIONAL_STAGES or (s == "indexes" and performance_profile)
+    ]
+    resumed_from = None
+    if stages:
+        resumed_from = next((s for s in run_stages if s not in stages), None)
+        logger.info(
+            f"Resuming provisioning of {tenant_id} at stage: {resumed_from or 'done'}"
+        )
+
+    def complete(stage: str, result: dict):
+        save_checkpoint(database_url, tenant_id, inputs_hash, stage, result)
+        stages[stage] = {"completed_at": time.time(), "result": result}
+
+    local_path = None
+    table_info = None
+    try:
+        try:
+            if "migrate" not in stages:
+                # Create temporary directory for database initialization
+                local_path = tempfile.mkdtemp(prefix=f"db-init-{tenant_id}-")
+                logger.info(f"Using temporary directory: {local_path}")
+
+                # Clone repository to get migration files
+                logger.info("Cloning repository to get migration files...")
+                clone_repository(gh_pat, local_path)
+
+                logger.info("Initializing database with migrations...")
+                migration_sha = init_database_with_migrations(database_url, local_path)
+                complete("migrate", {"migration_sha": migration_sha})
+
+            if "verify" not in stages:
+                # Verify database structure
+                migration_sha = stages["migrate"]["result"].get("migration_sha")
+                connection = connect_to_database(database_url)
+                try:
+                    schema = verify_schema_fingerprint(connection, migration_sha)
+                    if include_table_info or schema["matches"] is False:
+                        table_info = describe_public_tables(connection)
+                finally:
+                    connection.close()
+
+                logger.info(f"Database initialized successfully for tenant {tenant_id}")
+                complete("verify", schema)
+            else:
+                schema = stages["verify"]["result"]
+
+            profile = stages.get("indexes", {}).get("result")
+            if "indexes" in run_stages and "indexes" not in stages:
+                logger.info("Applying performance profile indexes...")
+                profile = apply_performance_profile(database_url)
+                if any("error" in entry for entry in profile["indexes"]):
+                    raise Exception("Performance profile could not create every index")
+                complete("indexes", profile)
+
+        except Exception as e:
+            error_msg = f"Failed to initialize database: {str(e)}"
+            logger.error(error_msg)
+            return {
+                "error": error_msg,
+                "tenant_id": tenant_id,
+                "status": "error",
+                "completed_stages": list(stages),
+                "dependencies": dependency_states(),
+            }, dependency_error_status(e)
+
+        if "dispatch" in stages:
+            workflow_id = stages["dispatch"]["result"]["workflow_id"]
+        else:
+            # Trigger GitHub Actions workflow
+            logger.info("Triggering GitHub Actions workflow...")
+            workflow_id = trigger_github_workflow(
+                gh_pat, tenant_id, "main", workflow_inputs  # Use main branch
+            )
+            complete("dispatch", {"workflow_id": workflow_id})
+
+        # Get the container URL
+        container_url = get_container_url(gh_pat, workflow_id, tenant_id)
+
+        logger.info(f"Successfully initiated deployment for tenant {tenant_id}")
+
+        body = {
+            "message": f"Tenant {tenant_id} deployment initiated successfully",
+            "tenant_id": tenant_id,
+            "container_name": f"quiz-app-{tenant_id}",
+            "image_name": workflow_inputs.get(
+                "image", f"ghcr.io/keydyy/{IMAGE_NAME}-{tenant_id}:latest"
+            ),
+            "deploy_mode": "shared" if "image" in workflow_inputs else "per_tenant",
+            "workflow_id": workflow_id,
+            "status": "deployment_in_progress",
+            "github_actions_url": f"https://github.com/keydyy/quiz_app_ct/actions/workflows/{workflow_id}",
+            "container_url": container_url,
+            "database_initialized": True,
+            "schema_fingerprint": schema,
+            "performance_profile": profile,
+            "dispatch": get_dispatch_status("Build & Deploy Tenant", tenant_id),
+            "resumed_from": resumed_from,
+        }
+        if table_info is not None:
+            body["table_info"] = table_info
+        return body, 200
+
+    except Exception as e:
+        logger.exception("Error in CreateTenant provisioning pipeline")
+        return {
+            "error": f"Failed to create tenant: {str(e)}",
+            "tenant_id": tenant_id,
+            "completed_stages": list(stages),
+            "dependencies": dependency_states(),
+        }, dependency_error_status(e)
+
+    finally:
+        # Clean up temporary directory
+        if local_path and os.path.exists(local_path):
+            try:
+                shutil.rmtree(local_path)
+                logger.info(f"Cleaned up temporary directory: {local_path}")
+            except Exception as cleanup_error:
+                logger.warning(f"Failed to cleanup {local_path}: {cleanup_error}")
+
+
+@app.function_name(name="CreateTenant")
+@app.route(route="create-tenant", auth_level=func.AuthLevel.FUNCTION)
+@instrumented("CreateTenant")
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        logger.info("Starting CreateTenant function")
+
+        # Parse request
+        try:
+            data = req.get_json()
+            if not data:
+                return func.HttpResponse(
+                    json.dumps({"error": "No JSON data provided"}),
+                    status_code=400,
+                    mimetype="application/json",
+                )
+        except Exception as e:
+            return func.HttpResponse(
+                json.dumps({"error": f"Invalid JSON: {str(e)}"}),
+                status_code=400,
+                mimetype="application/json",
+            )
+
+        # Extract and validate parameters
+        tenant_id = data.get("tenant_id")
+        supabase_url = data.get("supabase_url")
+        supabase_key = data.get("supabase_anon_key")
+        database_url = data.get("database_url")
+        gh_pat = data.get("gh_pat")
+        idempotency_key = req.headers.get("Idempotency-Key") or data.get(
+            "idempotency_key"
+        )
+        include_table_info = bool(data.get("include_table_info", False))
+        performance_profile = bool(data.get("performance_profile", False))
+        deploy_mode = data.get(
+            "deploy_mode", os.environ.get("DEPLOY_MODE", "per_tenant")
+        )
+
+        # Optional parameters for container configuration
+        cpu_limit = data.get("cpu_limit", "0.5")
+        memory_limit = data.get("memory_limit", "1Gi")
+        min_replicas = data.get("min_replicas", 1)
+        max_replicas = data.get("max_replicas", 3)
+
+        logger.info(f"Processing tenant: {tenant_id}")
 
         # Validate required fields
         if not all([tenant_id, supabase_url, supabase_key, database_url, gh_pat]):
@@ -528,124 +2420,99 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype="application/json",
             )
 
-        # Store tenant configuration in environment variables
-        os.environ[f"SUPABASE_URL_{tenant_id}"] = supabase_url
-        os.environ[f"SUPABASE_KEY_{tenant_id}"] = supabase_key
-        os.environ[f"DATABASE_URL_{tenant_id}"] = database_url
-        os.environ[f"CPU_LIMIT_{tenant_id}"] = str(cpu_limit)
-        os.environ[f"MEMORY_LIMIT_{tenant_id}"] = str(memory_limit)
-        os.environ[f"MIN_REPLICAS_{tenant_id}"] = str(min_replicas)
-        os.environ[f"MAX_REPLICAS_{tenant_id}"] = str(max_replicas)
-
-        # Create temporary directory for database initialization
-        local_path = tempfile.mkdtemp(prefix=f"db-init-{tenant_id}-")
-        logger.info(f"Using temporary directory: {local_path}")
-
-        # Clone repository to get migration files
-        logger.info("Cloning repository to get migration files...")
-        authenticated_url = REPO_URL.replace("https://", f"https://{gh_pat}@")
-        run_command(f"git clone --branch main {authenticated_url} {local_path}")
-
-        # Initialize database with migrations
         try:
-            logger.info("Initializing database with migrations...")
-            init_database_with_migrations(database_url, local_path)
-
-            # Verify database structure
-            connection = connect_to_database(database_url)
-            cursor = connection.cursor()
-
-            # Get all tables
-            cursor.execute(
-                """
-                SELECT table_name, table_type 
-                FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                ORDER BY table_name
-            """
+            image = resolve_deploy_image(deploy_mode, tenant_id)
+        except ValueError as e:
+            return func.HttpResponse(
+                json.dumps({"error": str(e), "tenant_id": tenant_id}),
+                status_code=400,
+                mimetype="application/json",
             )
-            tables = cursor.fetchall()
 
-            # Get table information
-            table_info = {}
-            for table_name, table_type in tables:
-                cursor.execute(
-                    f"""
-                    SELECT column_name, data_type, is_nullable, column_default
-                    FROM information_schema.columns 
-                    WHERE table_schema = 'public' AND table_name = '{table_name}'
-                    ORDER BY ordinal_position
-                """
-                )
-                columns = cursor.fetchall()
-                table_info[table_name] = {
-                    "type": table_type,
-                    "columns": [
+        # Collapse duplicate client retries into the same job
+        job = None
+        if idempotency_key:
+            job, is_owner = begin_idempotent_job(idempotency_key, tenant_id)
+            if job["tenant_id"] != tenant_id:
+                return func.HttpResponse(
+                    json.dumps(
                         {
-                            "name": col[0],
-                            "type": col[1],
-                            "nullable": col[2],
-                            "default": col[3],
+                            "error": "Idempotency-Key was already used for another tenant",
+                            "tenant_id": tenant_id,
                         }
-                        for col in columns
-                    ],
-                }
-
-            cursor.close()
-            connection.close()
-
-            logger.info(f"Database initialized successfully for tenant {tenant_id}")
-            logger.info(f"Created tables: {', '.join([table[0] for table in tables])}")
+                    ),
+                    status_code=422,
+                    mimetype="application/json",
+                )
+            if not is_owner:
+                logger.info(f"Duplicate CreateTenant request for key {idempotency_key}")
+                if not job["done"].wait(IDEMPOTENCY_WAIT_SECONDS):
+                    return func.HttpResponse(
+                        json.dumps(
+                            {
+                                "message": f"Tenant {tenant_id} provisioning is still in progress",
+                                "tenant_id": tenant_id,
+                                "status": "in_progress",
+                            }
+                        ),
+                        status_code=202,
+                        mimetype="application/json",
+                    )
+                return func.HttpResponse(
+                    json.dumps(job["body"]),
+                    status_code=job["status_code"],
+                    mimetype="application/json",
+                    headers={"Idempotent-Replayed": "true"},
+                )
 
-        except Exception as e:
-            error_msg = f"Failed to initialize database: {str(e)}"
-            logger.error(error_msg)
-            return func.HttpResponse(
-                json.dumps(
-                    {"error": error_msg, "tenant_id": tenant_id, "status": "error"}
-                ),
-                status_code=500,
-                mimetype="application/json",
+        try:
+            # Store tenant configuration in environment variables
+            os.environ[f"SUPABASE_URL_{tenant_id}"] = supabase_url
+            os.environ[f"SUPABASE_KEY_{tenant_id}"] = supabase_key
+            os.environ[f"DATABASE_URL_{tenant_id}"] = database_url
+            os.environ[f"CPU_LIMIT_{tenant_id}"] = str(cpu_limit)
+            os.environ[f"MEMORY_LIMIT_{tenant_id}"] = str(memory_limit)
+            os.environ[f"MIN_REPLICAS_{tenant_id}"] = str(min_replicas)
+            os.environ[f"MAX_REPLICAS_{tenant_id}"] = str(max_replicas)
+
+            # Prepare workflow inputs for GitHub Actions
+            workflow_inputs = {
+                "tenant_id": tenant_id,
+                "supabase_url": supabase_url,
+                "supabase_anon_key": supabase_key,
+                "database_url": database_url,
+                "cpu_limit": str(cpu_limit),
+                "memory_limit": memory_limit,
+                "min_replicas": str(min_replicas),
+                "max_replicas": str(max_replicas),
+            }
+            if deploy_mode == "shared":
+                # The workflow skips the Docker build when an image is given
+                workflow_inputs["image"] = image
+            inputs_hash = provisioning_inputs_hash(
+                *[workflow_inputs[k] for k in sorted(workflow_inputs)]
             )
 
-        # Prepare workflow inputs for GitHub Actions
-        workflow_inputs = {
-            "tenant_id": tenant_id,
-            "supabase_url": supabase_url,
-            "supabase_anon_key": supabase_key,
-            "database_url": database_url,
-            "cpu_limit": str(cpu_limit),
-            "memory_limit": memory_limit,
-            "min_replicas": str(min_replicas),
-            "max_replicas": str(max_replicas),
-        }
-
-        # Trigger GitHub Actions workflow
-        logger.info("Triggering GitHub Actions workflow...")
-        workflow_id = trigger_github_workflow(
-            gh_pat, tenant_id, "main", workflow_inputs  # Use main branch
-        )
-
-        # Get the container URL
-        container_url = get_container_url(gh_pat, workflow_id)
+            body, status_code = run_provisioning_pipeline(
+                tenant_id,
+                database_url,
+                gh_pat,
+                workflow_inputs,
+                inputs_hash,
+                include_table_info=include_table_info,
+                performance_profile=performance_profile,
+            )
+        except Exception as e:
+            logger.exception("Error in CreateTenant function")
+            body = {"error": f"Failed to create tenant: {str(e)}", "tenant_id": tenant_id}
+            status_code = 500
 
-        logger.info(f"Successfully initiated deployment for tenant {tenant_id}")
+        if job:
+            finish_idempotent_job(job, body, status_code)
 
         return func.HttpResponse(
-            json.dumps(
-                {
-                    "message": f"Tenant {tenant_id} deployment initiated successfully",
-                    "tenant_id": tenant_id,
-                    "container_name": f"quiz-app-{tenant_id}",
-                    "image_name": f"ghcr.io/keydyy/{IMAGE_NAME}-{tenant_id}:latest",
-                    "workflow_id": workflow_id,
-                    "status": "deployment_in_progress",
-                    "github_actions_url": f"https://github.com/keydyy/quiz_app_ct/actions/workflows/{workflow_id}",
-                    "container_url": container_url,
-                    "database_initialized": True,
-                }
-            ),
-            status_code=200,
+            json.dumps(body),
+            status_code=status_code,
             mimetype="application/json",
         )
 
@@ -666,6 +2533,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
 # Database initialization test endpoint
 @app.function_name(name="InitDatabase")
 @app.route(route="init-database", auth_level=func.AuthLevel.FUNCTION)
+@instrumented("InitDatabase")
 def init_database(req: func.HttpRequest) -> func.HttpResponse:
     """Test endpoint for database initialization"""
     local_path = None
@@ -693,6 +2561,7 @@ def init_database(req: func.HttpRequest) -> func.HttpResponse:
             "tenant_id", "test-tenant"
         )  # Optional, for logging purposes
         gh_pat = data.get("gh_pat")  # Add GitHub token for private repo
+        include_table_info = bool(data.get("include_table_info", False))
 
         if not database_url:
             return func.HttpResponse(
@@ -707,11 +2576,7 @@ def init_database(req: func.HttpRequest) -> func.HttpResponse:
 
         # Clone repository to get migration files
         logger.info("Cloning repository...")
-        if gh_pat:
-            authenticated_url = REPO_URL.replace("https://", f"https://{gh_pat}@")
-            run_command(f"git clone --branch main {authenticated_url} {local_path}")
-        else:
-            run_command(f"git clone --branch main {REPO_URL} {local_path}")
+        clone_repository(gh_pat, local_path)
 
         # List directory contents for debugging
         logger.info("Repository contents:")
@@ -725,63 +2590,32 @@ def init_database(req: func.HttpRequest) -> func.HttpResponse:
 
         # Initialize database with migrations
         try:
-            init_database_with_migrations(database_url, local_path)
+            migration_sha = init_database_with_migrations(database_url, local_path)
 
-            # Additional verification - connect and check tables
+            # Additional verification - compare the schema fingerprint
             connection = connect_to_database(database_url)
-            cursor = connection.cursor()
-
-            # Get all tables
-            cursor.execute(
-                """
-                SELECT table_name, table_type 
-                FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                ORDER BY table_name
-            """
-            )
-            tables = cursor.fetchall()
-
-            # Get all columns for each table
-            table_info = {}
-            for table_name, table_type in tables:
-                cursor.execute(
-                    f"""
-                    SELECT column_name, data_type, is_nullable, column_default
-                    FROM information_schema.columns 
-                    WHERE table_schema = 'public' AND table_name = '{table_name}'
-                    ORDER BY ordinal_position
-                """
-                )
-                columns = cursor.fetchall()
-                table_info[table_name] = {
-                    "type": table_type,
-                    "columns": [
-                        {
-                            "name": col[0],
-                            "type": col[1],
-                            "nullable": col[2],
-                            "default": col[3],
-                        }
-                        for col in columns
-                    ],
-                }
-
-            cursor.close()
-            connection.close()
+            try:
+                schema = verify_schema_fingerprint(connection, migration_sha)
+                table_info = None
+                if include_table_info or schema["matches"] is False:
+                    table_info = describe_public_tables(connection)
+            finally:
+                connection.close()
 
             logger.info(f"Database initialized with migrations for tenant {tenant_id}")
 
+            body = {
+                "message": f"Database initialized successfully for tenant {tenant_id}",
+                "tenant_id": tenant_id,
+                "status": "success",
+                "schema_fingerprint": schema,
+            }
+            if table_info is not None:
+                body["tables_created"] = len(table_info)
+                body["table_info"] = table_info
+
             return func.HttpResponse(
-                json.dumps(
-                    {
-                        "message": f"Database initialized successfully for tenant {tenant_id}",
-                        "tenant_id": tenant_id,
-                        "status": "success",
-                        "tables_created": len(tables),
-                        "table_info": table_info,
-                    }
-                ),
+                json.dumps(body),
                 status_code=200,
                 mimetype="application/json",
             )
@@ -795,9 +2629,10 @@ def init_database(req: func.HttpRequest) -> func.HttpResponse:
                         "error": error_msg,
                         "tenant_id": tenant_id,
                         "status": "error",
+                        "dependencies": dependency_states(),
                     }
                 ),
-                status_code=500,
+                status_code=dependency_error_status(e),
                 mimetype="application/json",
             )
 
@@ -825,76 +2660,14 @@ def init_database(req: func.HttpRequest) -> func.HttpResponse:
                 logger.warning(f"Failed to cleanup {local_path}: {cleanup_error}")
 
 
-def check_git_availability():
-    """Check if git is available"""
-    try:
-        result = subprocess.run(["git", "--version"], capture_output=True, text=True)
-        return result.returncode == 0
-    except:
-        return False
-
-
-@app.function_name(name="GetTenantConfig")
-@app.route(route="get-tenant-config", auth_level=func.AuthLevel.FUNCTION)
-def get_tenant_config(req: func.HttpRequest) -> func.HttpResponse:
-    """Get tenant configuration from Azure Function"""
-    try:
-        # Get tenant_id from query parameters
-        tenant_id = req.params.get("tenant_id")
-        if not tenant_id:
-            return func.HttpResponse(
-                json.dumps({"error": "Missing tenant_id parameter"}),
-                status_code=400,
-                mimetype="application/json",
-            )
-
-        # Get configuration from environment variables or database
-        # For now, we'll use environment variables, but you might want to store this in a database
-        config = {
-            "tenant_id": tenant_id,
-            "supabase_url": os.environ.get(f"SUPABASE_URL_{tenant_id}"),
-            "supabase_anon_key": os.environ.get(f"SUPABASE_KEY_{tenant_id}"),
-            "database_url": os.environ.get(f"DATABASE_URL_{tenant_id}"),
-            "cpu_limit": os.environ.get(f"CPU_LIMIT_{tenant_id}", "0.5"),
-            "memory_limit": os.environ.get(f"MEMORY_LIMIT_{tenant_id}", "1Gi"),
-            "min_replicas": os.environ.get(f"MIN_REPLICAS_{tenant_id}", "1"),
-            "max_replicas": os.environ.get(f"MAX_REPLICAS_{tenant_id}", "3"),
-        }
-
-        # Validate required fields
-        if not all(
-            [
-                config["supabase_url"],
-                config["supabase_anon_key"],
-                config["database_url"],
-            ]
-        ):
-            return func.HttpResponse(
-                json.dumps({"error": "Missing required configuration for tenant"}),
-                status_code=404,
-                mimetype="application/json",
-            )
-
-        return func.HttpResponse(
-            json.dumps(config), status_code=200, mimetype="application/json"
-        )
-
-    except Exception as e:
-        logger.exception("Error in GetTenantConfig function")
-        return func.HttpResponse(
-            json.dumps({"error": f"Failed to get tenant configuration: {str(e)}"}),
-            status_code=500,
-            mimetype="application/json",
-        )
-
-
-@app.function_name(name="DeleteTenant")
-@app.route(route="delete-tenant", auth_level=func.AuthLevel.FUNCTION)
-def delete_tenant(req: func.HttpRequest) -> func.HttpResponse:
-    """Delete a tenant and its resources"""
+@app.function_name(name="SchemaDiff")
+@app.route(route="schema-diff", auth_level=func.AuthLevel.FUNCTION)
+@instrumented("SchemaDiff")
+def schema_diff(req: func.HttpRequest) -> func.HttpResponse:
+    """Diff a tenant database against prisma/schema.prisma and optionally repair it"""
+    local_path = None
     try:
-        logger.info("Starting DeleteTenant function")
-
+        logger.info("Starting SchemaDiff function")
         # Parse request
         try:
             data = req.get_json()
@@ -911,72 +2684,1113 @@ def delete_tenant(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype="application/json",
             )
 
-        # Extract and validate parameters
-        tenant_id = data.get("tenant_id")
+        database_url = data.get("database_url")
+        tenant_id = data.get("tenant_id", "unknown")
         gh_pat = data.get("gh_pat")
+        apply = bool(data.get("apply", False))  # dry run unless asked to apply
 
-        if not all([tenant_id, gh_pat]):
-            missing_fields = []
-            if not tenant_id:
-                missing_fields.append("tenant_id")
-            if not gh_pat:
-                missing_fields.append("gh_pat")
-
+        if not database_url:
             return func.HttpResponse(
-                json.dumps(
-                    {"error": f"Missing required fields: {', '.join(missing_fields)}"}
-                ),
+                json.dumps({"error": "Missing required field: database_url"}),
                 status_code=400,
                 mimetype="application/json",
             )
 
-        # Trigger GitHub Actions workflow for deletion
-        try:
-            headers = {
-                "Authorization": f"token {gh_pat}",
-                "Accept": "application/vnd.github.v3+json",
-            }
+        local_path = tempfile.mkdtemp(prefix=f"schema-diff-{tenant_id}-")
+        clone_repository(gh_pat, local_path)
 
-            # Get the workflow ID for "Delete Tenant"
-            workflow_url = (
-                f"{GITHUB_API_URL}/repos/keydyy/quiz_app_ct/actions/workflows"
+        connection = connect_to_database(database_url)
+        try:
+            result = repair_schema(
+                connection, Path(local_path) / "prisma" / "schema.prisma", apply=apply
             )
-            response = requests.get(workflow_url, headers=headers, timeout=30)
-            if response.status_code != 200:
-                raise Exception(
-                    f"Failed to get workflows: {response.status_code} - {response.text}"
+        finally:
+            connection.close()
+
+        return func.HttpResponse(
+            json.dumps(
+                {
+                    "tenant_id": tenant_id,
+                    "status": "error" if result["errors"] else "success",
+                    "dry_run": not apply,
+                    **result,
+                }
+            ),
+            status_code=200,
+            mimetype="application/json",
+        )
+
+    except Exception as e:
+        logger.exception("Error in SchemaDiff function")
+        return func.HttpResponse(
+            json.dumps(
+                {
+                    "error": f"Failed to diff schema: {str(e)}",
+                    "tenant_id": tenant_id if "tenant_id" in locals() else "unknown",
+                    "status": "error",
+                }
+            ),
+            status_code=500,
+            mimetype="application/json",
+        )
+
+    finally:
+        # Clean up temporary directory
+        if local_path and os.path.exists(local_path):
+            try:
+                shutil.rmtree(local_path)
+                logger.info(f"Cleaned up temporary directory: {local_path}")
+            except Exception as cleanup_error:
+                logger.warning(f"Failed to cleanup {local_path}: {cleanup_error}")
+
+
+def check_git_availability():
+    """Check if git is available"""
+    try:
+        result = subprocess.run(["git", "--version"], capture_output=True, text=True)
+        return result.returncode == 0
+    except:
+        return False
+
+
+TENANT_CONFIG_BATCH_LIMIT = 500  # tenant IDs per batch request
+
+
+def read_tenant_config(tenant_id: str):
+    """Return the stored configuration of a tenant, or None if it is incomplete"""
+    config = {
+        "tenant_id": tenant_id,
+        "supabase_url": os.environ.get(f"SUPABASE_URL_{tenant_id}"),
+        "supabase_anon_key": os.environ.get(f"SUPABASE_KEY_{tenant_id}"),
+        "database_url": os.environ.get(f"DATABASE_URL_{tenant_id}"),
+        "cpu_limit": os.environ.get(f"CPU_LIMIT_{tenant_id}", "0.5"),
+        "memory_limit": os.environ.get(f"MEMORY_LIMIT_{tenant_id}", "1Gi"),
+        "min_replicas": os.environ.get(f"MIN_REPLICAS_{tenant_id}", "1"),
+        "max_replicas": os.environ.get(f"MAX_REPLICAS_{tenant_id}", "3"),
+    }
+
+    # Validate required fields
+    if not all(
+        [
+            config["supabase_url"],
+            config["supabase_anon_key"],
+            config["database_url"],
+        ]
+    ):
+        return None
+    return config
+
+
+def config_etag(body: str) -> str:
+    """Strong ETag of a serialized config response"""
+    return '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(req: func.HttpRequest, etag: str) -> bool:
+    """True if the request's If-None-Match already names etag"""
+    header = req.headers.get("If-None-Match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    matched = "*" in tags or etag in [t[2:] if t.startswith("W/") else t for t in tags]
+    record_cache_lookup("tenant_config_etag", matched)
+    return matched
+
+
+def conditional_response(req: func.HttpRequest, body: str, mimetype: str):
+    """200 with an ETag, or an empty 304 if the client already has this body"""
+    etag = config_etag(body)
+    if etag_matches(req, etag):
+        return func.HttpResponse(status_code=304, headers={"ETag": etag})
+    return func.HttpResponse(
+        body, status_code=200, mimetype=mimetype, headers={"ETag": etag}
+    )
+
+
+@app.function_name(name="GetTenantConfig")
+@app.route(route="get-tenant-config", auth_level=func.AuthLevel.FUNCTION)
+@instrumented("GetTenantConfig")
+def get_tenant_config(req: func.HttpRequest) -> func.HttpResponse:
+    """Get tenant configuration from Azure Function"""
+    try:
+        # Get tenant_id from query parameters
+        tenant_id = req.params.get("tenant_id")
+        if not tenant_id:
+            return func.HttpResponse(
+                json.dumps({"error": "Missing tenant_id parameter"}),
+                status_code=400,
+                mimetype="application/json",
+            )
+
+        # Get configuration from environment variables or database
+        # For now, we'll use environment variables, but you might want to store this in a database
+        config = read_tenant_config(tenant_id)
+        if config is None:
+            return func.HttpResponse(
+                json.dumps({"error": "Missing required configuration for tenant"}),
+                status_code=404,
+                mimetype="application/json",
+            )
+
+        return conditional_response(req, json.dumps(config), "application/json")
+
+    except Exception as e:
+        logger.exception("Error in GetTenantConfig function")
+        return func.HttpResponse(
+            json.dumps({"error": f"Failed to get tenant configuration: {str(e)}"}),
+            status_code=500,
+            mimetype="application/json",
+        )
+
+
+@app.function_name(name="GetTenantConfigs")
+@app.route(
+    route="tenant-configs",
+    methods=["GET", "POST"],
+    auth_level=func.AuthLevel.FUNCTION,
+)
+@instrumented("GetTenantConfigs")
+def get_tenant_configs(req: func.HttpRequest) -> func.HttpResponse:
+    """Get the configuration of many tenants in one conditional request.
+
+    ?tenant_ids=a,b (or a JSON body {"tenant_ids": [...]}) returns
+    {"tenants": {...}, "missing": [...]}; ?all=true exports every registered
+    tenant as NDJSON, one config per line ordered by tenant ID. Both carry an
+    ETag and answer If-None-Match with 304 when nothing has changed.
+    """
+    try:
+        if req.params.get("all", "").lower() == "true":
+            lines = []
+            for tenant_id in sorted(list_registered_tenants()):
+                config = read_tenant_config(tenant_id)
+                if config is not None:
+                    lines.append(json.dumps(config) + "\n")
+            return conditional_response(req, "".join(lines), "application/x-ndjson")
+
+        tenant_ids = []
+        if req.params.get("tenant_ids"):
+            tenant_ids = req.params["tenant_ids"].split(",")
+        elif req.get_body():
+            try:
+                tenant_ids = (req.get_json() or {}).get("tenant_ids") or []
+            except ValueError as e:
+                return func.HttpResponse(
+                    json.dumps({"error": f"Invalid JSON: {str(e)}"}),
+                    status_code=400,
+                    mimetype="application/json",
                 )
+        if not isinstance(tenant_ids, list):
+            tenant_ids = []
+        # Deduplicate while keeping the caller's order, so the ETag is stable
+        tenant_ids = [str(t).strip() for t in tenant_ids]
+        tenant_ids = list(dict.fromkeys(t for t in tenant_ids if t))
 
-            workflows = response.json()["workflows"]
-            delete_workflow = next(
-                (w for w in workflows if w["name"] == "Delete Tenant"), None
+        if not tenant_ids:
+            return func.HttpResponse(
+                json.dumps({"error": "Missing tenant_ids or all=true parameter"}),
+                status_code=400,
+                mimetype="application/json",
             )
-            if not delete_workflow:
-                available_workflows = [w["name"] for w in workflows]
-                raise Exception(
-                    f"Delete Tenant workflow not found. Available workflows: {available_workflows}"
+        if len(tenant_ids) > TENANT_CONFIG_BATCH_LIMIT:
+            return func.HttpResponse(
+                json.dumps(
+                    {
+                        "error": f"At most {TENANT_CONFIG_BATCH_LIMIT} tenant_ids per request; "
+                        "use all=true for a full export"
+                    }
+                ),
+                status_code=400,
+                mimetype="application/json",
+            )
+
+        tenants, missing = {}, []
+        for tenant_id in tenant_ids:
+            config = read_tenant_config(tenant_id)
+            if config is None:
+                missing.append(tenant_id)
+            else:
+                tenants[tenant_id] = config
+
+        return conditional_response(
+            req, json.dumps({"tenants": tenants, "missing": missing}), "application/json"
+        )
+
+    except Exception as e:
+        logger.exception("Error in GetTenantConfigs function")
+        return func.HttpResponse(
+            json.dumps({"error": f"Failed to get tenant configurations: {str(e)}"}),
+            status_code=500,
+            mimetype="application/json",
+        )
+
+
+def list_registered_tenants() -> dict:
+    """Return {tenant_id: database_url} for every tenant registered by CreateTenant"""
+    prefix = "DATABASE_URL_"
+    return {
+        key[len(prefix) :]: value
+        for key, value in os.environ.items()
+        if key.startswith(prefix) and value
+    }
+
+
+# Bookkeeping lives outside the public schema so it never shows up in the
+# schema fingerprint or the schema.prisma diff.
+STATISTICS_WATERMARK_DDL = [
+    "CREATE SCHEMA IF NOT EXISTS quiz_maintenance",
+    """
+    CREATE TABLE IF NOT EXISTS quiz_maintenance.statistics_watermark (
+        id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+        last_answer_id INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    "INSERT INTO quiz_maintenance.statistics_watermark (id) VALUES (TRUE) ON CONFLICT DO NOTHING",
+]
+
+# Folds GameAnswers rows in (watermark, upper] into Statistics. A game counts
+# as a newly taken quiz when the user had no answers for it before the
+# watermark; an answer is correct when is_correct[1] is true.
+STATISTICS_FOLD_SQL = """
+    WITH new_answers AS (
+        SELECT
+            a.user_id,
+            a.game_id,
+            COALESCE(a.is_correct[1], FALSE) AS correct,
+            NOT EXISTS (
+                SELECT 1 FROM "public"."GameAnswers" old
+                WHERE old.user_id = a.user_id
+                  AND old.game_id = a.game_id
+                  AND old.answer_id <= %(watermark)s
+            ) AS new_game
+        FROM "public"."GameAnswers" a
+        WHERE a.answer_id > %(watermark)s AND a.answer_id <= %(upper)s
+    ),
+    per_user AS (
+        SELECT
+            user_id,
+            COUNT(DISTINCT game_id) FILTER (WHERE new_game) AS quizzes_taken,
+            COUNT(*) FILTER (WHERE correct) AS correct_answers
+        FROM new_answers
+        GROUP BY user_id
+    ),
+    updated AS (
+        UPDATE "public"."Statistics" s
+        SET total_quizzes_taken = COALESCE(s.total_quizzes_taken, 0) + p.quizzes_taken,
+            total_correct_answers = COALESCE(s.total_correct_answers, 0) + p.correct_answers
+        FROM per_user p
+        WHERE s.stat_id = (
+            SELECT MIN(stat_id) FROM "public"."Statistics" WHERE user_id = p.user_id
+        )
+        RETURNING s.user_id
+    )
+    INSERT INTO "public"."Statistics" (user_id, total_quizzes_taken, total_correct_answers)
+    SELECT p.user_id, p.quizzes_taken, p.correct_answers
+    FROM per_user p
+    WHERE p.user_id NOT IN (SELECT user_id FROM updated)
+"""
+
+
+def aggregate_tenant_statistics(database_url: str) -> dict:
+    """Fold GameAnswers added since the stored high-water mark into Statistics.
+
+    Runs in one transaction with the watermark row locked, so concurrent runs
+    for the same tenant can never count an answer twice. GameAnswers is held
+    in SHARE mode from before the upper bound is read until the fold commits:
+    answer_id comes from a sequence, so an insert still in flight can commit
+    an id below MAX(answer_id) and would otherwise end up under the watermark
+    without ever being counted.
+    """
+    connection = connect_to_database(database_url)
+    try:
+        cursor = connection.cursor()
+        for statement in STATISTICS_WATERMARK_DDL:
+            cursor.execute(statement)
+        connection.commit()
+
+        cursor.execute(
+            "SELECT last_answer_id FROM quiz_maintenance.statistics_watermark FOR UPDATE"
+        )
+        watermark = cursor.fetchone()[0]
+        # Waits for in-flight inserts and blocks new ones until commit
+        cursor.execute('LOCK TABLE "public"."GameAnswers" IN SHARE MODE')
+        cursor.execute(
+            'SELECT COALESCE(MAX(answer_id), 0) FROM "public"."GameAnswers"'
+        )
+        upper = cursor.fetchone()[0]
+
+        if upper <= watermark:
+            connection.rollback()
+            return {"previous_watermark": watermark, "watermark": watermark}
+
+        cursor.execute(STATISTICS_FOLD_SQL, {"watermark": watermark, "upper": upper})
+        cursor.execute(
+            """
+            UPDATE quiz_maintenance.statistics_watermark
+            SET last_answer_id = %s, updated_at = now()
+            """,
+            (upper,),
+        )
+        connection.commit()
+        cursor.close()
+        return {"watermark": upper, "previous_watermark": watermark}
+
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+# Game history archival. The live MultiplayerGame/GameAnswers tables keep
+# their schema.prisma shape (game_id keys and foreign keys cannot include a
+# partition key); games older than GAME_HISTORY_RETENTION_DAYS are moved into
+# range-partitioned history tables, one partition per month of start_time.
+GAME_HISTORY_RETENTION_DAYS = int(os.environ.get("GAME_HISTORY_RETENTION_DAYS", "90"))
+HISTORY_PARTITIONS_AHEAD = int(os.environ.get("HISTORY_PARTITIONS_AHEAD", "3"))
+HISTORY_KEEP_MONTHS = int(os.environ.get("HISTORY_KEEP_MONTHS", "12"))
+ARCHIVE_BATCH_GAMES = 1000
+ARCHIVE_DIR = os.environ.get(
+    "ARCHIVE_DIR", os.path.join(tempfile.gettempdir(), "quiz-archive")
+)
+# The default ARCHIVE_DIR is instance-local scratch space that is lost on
+# restart or scale-in, so only an explicit one counts as durable storage.
+ARCHIVE_DIR_CONFIGURED = "ARCHIVE_DIR" in os.environ
+
+GAME_HISTORY_TABLES = ["multiplayer_game_history", "game_answers_history"]
+GAME_HISTORY_DDL = [
+    "CREATE SCHEMA IF NOT EXISTS quiz_maintenance",
+    """
+    CREATE TABLE IF NOT EXISTS quiz_maintenance.multiplayer_game_history
+        (LIKE "public"."MultiplayerGame")
+        PARTITION BY RANGE (start_time)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS quiz_maintenance.game_answers_history
+        (LIKE "public"."GameAnswers", game_start_time TIMESTAMP(6) NOT NULL)
+        PARTITION BY RANGE (game_start_time)
+    """,
+]
+
+# Moves one batch of old games and their answers into the history tables.
+# Games with answers the Statistics job has not folded yet are left alone;
+# the watermark never passes an uncommitted answer_id (see
+# aggregate_tenant_statistics), so every answer at or below it is counted.
+ARCHIVE_GAMES_SQL = """
+    WITH old_games AS (
+        SELECT g.game_id
+        FROM "public"."MultiplayerGame" g
+        WHERE g.start_time < %(cutoff)s
+          AND NOT EXISTS (
+              SELECT 1 FROM "public"."GameAnswers" a
+              WHERE a.game_id = g.game_id AND a.answer_id > %(watermark)s
+          )
+        ORDER BY g.start_time
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    ),
+    moved_answers AS (
+        DELETE FROM "public"."GameAnswers" a
+        USING "public"."MultiplayerGame" g, old_games o
+        WHERE a.game_id = o.game_id AND g.game_id = o.game_id
+        RETURNING a.*, g.start_time
+    ),
+    archived_answers AS (
+        INSERT INTO quiz_maintenance.game_answers_history
+        SELECT * FROM moved_answers
+        RETURNING 1
+    ),
+    moved_games AS (
+        DELETE FROM "public"."MultiplayerGame" g
+        USING old_games o
+        WHERE g.game_id = o.game_id
+        RETURNING g.*
+    ),
+    archived_games AS (
+        INSERT INTO quiz_maintenance.multiplayer_game_history
+        SELECT * FROM moved_games
+        RETURNING 1
+    )
+    SELECT
+        (SELECT COUNT(*) FROM archived_games),
+        (SELECT COUNT(*) FROM archived_answers)
+"""
+
+
+def _add_months(month, count: int):
+    """Return the first day of the month `count` months after `month`"""
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def ensure_history_partitions(cursor, months) -> list:
+    """Create the monthly history partitions of the given months if missing"""
+    created = []
+    for month in sorted(set(months)):
+        upper = _add_months(month, 1)
+        for table in GAME_HISTORY_TABLES:
+            partition = f"{table}_{month:%Y_%m}"
+            cursor.execute(
+                "SELECT to_regclass(%s)", (f"quiz_maintenance.{partition}",)
+            )
+            if cursor.fetchone()[0] is None:
+                cursor.execute(
+                    f"CREATE TABLE quiz_maintenance.{partition} "
+                    f"PARTITION OF quiz_maintenance.{table} "
+                    f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
                 )
+                created.append(partition)
+    return created
+
+
+def upload_archive(local_file: str, blob_name: str):
+    """Upload an archive file to ARCHIVE_SAS_URL (an Azure Blob container SAS URL)"""
+    sas_url = os.environ.get("ARCHIVE_SAS_URL")
+    if not sas_url:
+        return None
+    container_url, _, sas_token = sas_url.partition("?")
+    blob_url = f"{container_url}/{blob_name}?{sas_token}"
+    with open(local_file, "rb") as f:
+        response = requests.put(
+            blob_url, data=f, headers={"x-ms-blob-type": "BlockBlob"}, timeout=300
+        )
+    if response.status_code not in (200, 201):
+        raise Exception(
+            f"Failed to upload archive {blob_name}: {response.status_code} - {response.text}"
+        )
+    return f"{container_url}/{blob_name}"
+
+
+def archive_is_durable(export: dict) -> bool:
+    """Whether an exported file outlives this instance (uploaded or kept in ARCHIVE_DIR)"""
+    return bool(export.get("uploaded_to")) or ARCHIVE_DIR_CONFIGURED
 
-            # Trigger the workflow
-            trigger_url = f"{GITHUB_API_URL}/repos/keydyy/quiz_app_ct/actions/workflows/{delete_workflow['id']}/dispatches"
-            payload = {"ref": "main", "inputs": {"tenant_id": tenant_id}}
 
-            response = requests.post(
-                trigger_url, headers=headers, json=payload, timeout=30
+def export_relation(connection, tenant_id: str, relation: str, name: str) -> dict:
+    """Write a table to a gzip-compressed CSV and upload it if configured"""
+    directory = Path(ARCHIVE_DIR) / tenant_id
+    directory.mkdir(parents=True, exist_ok=True)
+    # Timestamped, so a table re-archived later never overwrites an earlier file
+    local_file = directory / f"{name}-{int(time.time())}.csv.gz"
+
+    cursor = connection.cursor()
+    with gzip.open(local_file, "wb") as f:
+        cursor.copy_expert(
+            f"COPY (SELECT * FROM {relation}) TO STDOUT WITH (FORMAT csv, HEADER)", f
+        )
+    cursor.close()
+
+    return {
+        "file": str(local_file),
+        "bytes": local_file.stat().st_size,
+        "uploaded_to": upload_archive(
+            str(local_file), f"{tenant_id}/{local_file.name}"
+        ),
+    }
+
+
+def export_history_partition(connection, tenant_id: str, partition: str) -> dict:
+    """Write a history partition to a gzip-compressed CSV and upload it if configured"""
+    return {
+        "partition": partition,
+        **export_relation(
+            connection, tenant_id, f"quiz_maintenance.{partition}", partition
+        ),
+    }
+
+
+def run_game_history_maintenance(
+    tenant_id: str,
+    database_url: str,
+    retention_days: int = GAME_HISTORY_RETENTION_DAYS,
+    months_ahead: int = HISTORY_PARTITIONS_AHEAD,
+    keep_months: int = HISTORY_KEEP_MONTHS,
+) -> dict:
+    """Archive old games into monthly partitions and export expired partitions.
+
+    1. Fold pending answers into Statistics so archiving never loses counts.
+    2. Create the partitions the archived games need, plus months_ahead more.
+    3. Move games older than retention_days (and their answers) in batches.
+    4. Export non-empty partitions older than keep_months, then detach and
+       drop them. A partition whose export only exists in the default
+       (temporary) ARCHIVE_DIR is detached and renamed to <partition>_detached
+       instead, and listed under "detached" in the report.
+    """
+    report = {"tenant_id": tenant_id, "archived_games": 0, "archived_answers": 0}
+    aggregate_tenant_statistics(database_url)
+
+    connection = connect_to_database(database_url)
+    try:
+        cursor = connection.cursor()
+        for statement in GAME_HISTORY_DDL:
+            cursor.execute(statement)
+        cursor.execute(
+            "SELECT last_answer_id FROM quiz_maintenance.statistics_watermark"
+        )
+        watermark = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT now()::timestamp - make_interval(days => %s)", (retention_days,)
+        )
+        cutoff = cursor.fetchone()[0]
+        cursor.execute(
+            """
+            SELECT DISTINCT date_trunc('month', start_time)::date
+            FROM "public"."MultiplayerGame"
+            WHERE start_time < %s
+        """,
+            (cutoff,),
+        )
+        months = [row[0] for row in cursor.fetchall()]
+
+        cutoff_month = cutoff.date().replace(day=1)
+        months += [_add_months(cutoff_month, i) for i in range(months_ahead + 1)]
+        report["partitions_created"] = ensure_history_partitions(cursor, months)
+        connection.commit()
+
+        while True:
+            cursor.execute(
+                ARCHIVE_GAMES_SQL,
+                {"cutoff": cutoff, "watermark": watermark, "limit": ARCHIVE_BATCH_GAMES},
             )
-            if response.status_code != 204:
-                raise Exception(
-                    f"Failed to trigger workflow: {response.status_code} - {response.text}"
+            games, answers = cursor.fetchone()
+            connection.commit()
+            report["archived_games"] += games
+            report["archived_answers"] += answers
+            if games < ARCHIVE_BATCH_GAMES:
+                break
+
+        # Partitions whose whole month is older than the kept window
+        expire_before = _add_months(cutoff_month, -keep_months)
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits i
+            JOIN pg_class parent ON parent.oid = i.inhparent
+            JOIN pg_class child ON child.oid = i.inhrelid
+            JOIN pg_namespace n ON n.oid = parent.relnamespace
+            WHERE n.nspname = 'quiz_maintenance' AND parent.relname = ANY(%s)
+            ORDER BY child.relname
+        """,
+            (GAME_HISTORY_TABLES,),
+        )
+        partitions = [row[0] for row in cursor.fetchall()]
+        connection.commit()
+
+        report["exported"] = []
+        report["detached"] = []
+        for partition in partitions:
+            table, _, suffix = partition.rpartition("_")
+            table, _, year = table.rpartition("_")
+            month = cutoff_month.replace(year=int(year), month=int(suffix))
+            if _add_months(month, 1) > expire_before:
+                continue
+
+            # Export first; the partition is only dropped once the file is
+            # stored somewhere that survives this instance
+            cursor.execute(
+                f"SELECT EXISTS (SELECT 1 FROM quiz_maintenance.{partition})"
+            )
+            export = None
+            if cursor.fetchone()[0]:
+                export = export_history_partition(connection, tenant_id, partition)
+                report["exported"].append(export)
+            cursor.execute(
+                f"ALTER TABLE quiz_maintenance.{table} DETACH PARTITION quiz_maintenance.{partition}"
+            )
+            if export is None or archive_is_durable(export):
+                cursor.execute(f"DROP TABLE quiz_maintenance.{partition}")
+            else:
+                # Renamed so a later archive of that month gets a new partition
+                cursor.execute(
+                    f"ALTER TABLE quiz_maintenance.{partition} RENAME TO {partition}_detached"
+                )
+                report["detached"].append(
+                    {
+                        "partition": partition,
+                        "table": f"quiz_maintenance.{partition}_detached",
+                        "reason": "export not uploaded (ARCHIVE_SAS_URL unset) "
+                        "and ARCHIVE_DIR not configured; data kept in the database",
+                    }
+                )
+                logger.warning(
+                    f"Kept expired partition {partition} of tenant {tenant_id} "
+                    f"detached: its export is only in the temporary {ARCHIVE_DIR}"
+                )
+            connection.commit()
+
+        cursor.close()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    logger.info(f"Game history maintenance for tenant {tenant_id}: {report}")
+    return report
+
+
+@app.function_name(name="GameHistoryMaintenance")
+@app.timer_trigger(schedule="0 0 3 * * *", arg_name="timer", run_on_startup=False)
+def game_history_maintenance(timer: func.TimerRequest) -> None:
+    """Archive and partition the game history of every registered tenant"""
+    for tenant_id, database_url in list_registered_tenants().items():
+        try:
+            run_game_history_maintenance(tenant_id, database_url)
+        except Exception as e:
+            logger.error(f"Game history maintenance failed for tenant {tenant_id}: {str(e)}")
+
+
+@app.function_name(name="RunGameHistoryMaintenance")
+@app.route(route="game-history-maintenance", auth_level=func.AuthLevel.FUNCTION)
+@instrumented("RunGameHistoryMaintenance")
+def game_history_maintenance_http(req: func.HttpRequest) -> func.HttpResponse:
+    """Run game history maintenance on demand for one or all registered tenants"""
+    try:
+        try:
+            data = req.get_json() or {}
+        except ValueError:
+            data = {}
+
+        registered = list_registered_tenants()
+        tenant_id = data.get("tenant_id")
+        if tenant_id and tenant_id not in registered:
+            return func.HttpResponse(
+                json.dumps({"error": f"Unknown tenant: {tenant_id}"}),
+                status_code=404,
+                mimetype="application/json",
+            )
+        targets = {tenant_id: registered[tenant_id]} if tenant_id else registered
+
+        options = {
+            key: int(data[key])
+            for key in ("retention_days", "months_ahead", "keep_months")
+            if key in data
+        }
+        results = {}
+        for target, database_url in targets.items():
+            try:
+                results[target] = run_game_history_maintenance(
+                    target, database_url, **options
+                )
+            except Exception as e:
+                logger.error(f"Game history maintenance failed for {target}: {str(e)}")
+                results[target] = {"error": str(e)}
+
+        return func.HttpResponse(
+            json.dumps({"tenants": results}, default=str),
+            status_code=200,
+            mimetype="application/json",
+        )
+
+    except Exception as e:
+        logger.exception("Error in RunGameHistoryMaintenance function")
+        return func.HttpResponse(
+            json.dumps({"error": f"Failed to run game history maintenance: {str(e)}"}),
+            status_code=500,
+            mimetype="application/json",
+        )
+
+
+@app.function_name(name="AggregateStatistics")
+@app.timer_trigger(schedule="0 */5 * * * *", arg_name="timer", run_on_startup=False)
+def aggregate_statistics(timer: func.TimerRequest) -> None:
+    """Keep every tenant's Statistics table in sync with its GameAnswers"""
+    tenants = list_registered_tenants()
+    logger.info(f"Aggregating statistics for {len(tenants)} tenant(s)")
+
+    for tenant_id, database_url in tenants.items():
+        try:
+            result = aggregate_tenant_statistics(database_url)
+            logger.info(f"Statistics aggregated for tenant {tenant_id}: {result}")
+        except Exception as e:
+            logger.error(f"Failed to aggregate statistics for tenant {tenant_id}: {str(e)}")
+
+
+@app.function_name(name="ApplyPerformanceProfile")
+@app.route(route="apply-performance-profile", auth_level=func.AuthLevel.FUNCTION)
+@instrumented("ApplyPerformanceProfile")
+def performance_profile(req: func.HttpRequest) -> func.HttpResponse:
+    """Apply the performance profile indexes to existing tenant databases"""
+    try:
+        try:
+            data = req.get_json()
+            if not data:
+                return func.HttpResponse(
+                    json.dumps({"error": "No JSON data provided"}),
+                    status_code=400,
+                    mimetype="application/json",
+                )
+        except Exception as e:
+            return func.HttpResponse(
+                json.dumps({"error": f"Invalid JSON: {str(e)}"}),
+                status_code=400,
+                mimetype="application/json",
+            )
+
+        # Either one database, some registered tenants or every registered tenant
+        registered = list_registered_tenants()
+        if data.get("database_url"):
+            targets = {data.get("tenant_id", "unknown"): data["database_url"]}
+        elif data.get("all_tenants"):
+            targets = registered
+        else:
+            tenant_ids = data.get("tenant_ids") or [data.get("tenant_id")]
+            unknown = [t for t in tenant_ids if t not in registered]
+            if unknown:
+                return func.HttpResponse(
+                    json.dumps({"error": f"Unknown tenants: {unknown}"}),
+                    status_code=404,
+                    mimetype="application/json",
+                )
+            targets = {t: registered[t] for t in tenant_ids}
+
+        results = {}
+        for tenant_id, database_url in targets.items():
+            try:
+                results[tenant_id] = apply_performance_profile(database_url)
+            except Exception as e:
+                logger.error(f"Performance profile failed for {tenant_id}: {str(e)}")
+                results[tenant_id] = {"error": str(e)}
+
+        return func.HttpResponse(
+            json.dumps({"tenants": results}),
+            status_code=200,
+            mimetype="application/json",
+        )
+
+    except Exception as e:
+        logger.exception("Error in ApplyPerformanceProfile function")
+        return func.HttpResponse(
+            json.dumps({"error": f"Failed to apply performance profile: {str(e)}"}),
+            status_code=500,
+            mimetype="application/json",
+        )
+
+
+HEALTH_HOT_TABLES = ["GameAnswers", "Questions", "MultiplayerGame", "GameInvitations"]
+HEALTH_TOP_QUERIES = 10
+HEALTH_PROBE_CONCURRENCY = int(os.environ.get("HEALTH_PROBE_CONCURRENCY", "8"))
+
+
+def _health_query(cursor, sql: str, params=None) -> list:
+    """Run a health query, returning rows as dicts; failures become an error entry"""
+    try:
+        cursor.execute("SAVEPOINT health_probe")
+        cursor.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        cursor.execute("RELEASE SAVEPOINT health_probe")
+        return rows
+    except Exception as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT health_probe")
+        return [{"error": str(e).strip()}]
+
+
+def collect_tenant_db_health(database_url: str) -> dict:
+    """Collect a compact, diffable performance snapshot of a tenant database.
+
+    Numbers are rounded and lists sorted by name so two snapshots can be
+    compared with a plain JSON diff.
+    """
+    with pooled_connection(database_url) as connection:
+        cursor = connection.cursor()
+        snapshot = {}
+
+        snapshot["cache_hit_ratio"] = _health_query(
+            cursor,
+            """
+            SELECT
+                round(blks_hit::numeric / NULLIF(blks_hit + blks_read, 0), 4)::float AS database,
+                (SELECT round(sum(heap_blks_hit)::numeric
+                        / NULLIF(sum(heap_blks_hit + heap_blks_read), 0), 4)::float
+                 FROM pg_statio_user_tables) AS tables,
+                (SELECT round(sum(idx_blks_hit)::numeric
+                        / NULLIF(sum(idx_blks_hit + idx_blks_read), 0), 4)::float
+                 FROM pg_statio_user_indexes) AS indexes
+            FROM pg_stat_database
+            WHERE datname = current_database()
+        """,
+        )[0]
+
+        snapshot["connections"] = _health_query(
+            cursor,
+            """
+            SELECT COALESCE(state, 'background') AS state, COUNT(*) AS count
+            FROM pg_stat_activity
+            WHERE datname = current_database()
+            GROUP BY 1
+            ORDER BY 1
+        """,
+        )
+        cursor.execute("SHOW max_connections")
+        snapshot["max_connections"] = int(cursor.fetchone()[0])
+
+        snapshot["hot_tables"] = _health_query(
+            cursor,
+            """
+            SELECT
+                relname AS table,
+                seq_scan,
+                seq_tup_read,
+                COALESCE(idx_scan, 0) AS idx_scan,
+                n_live_tup AS live_tuples,
+                n_dead_tup AS dead_tuples,
+                pg_total_relation_size(relid) AS total_bytes
+            FROM pg_stat_user_tables
+            WHERE schemaname = 'public' AND relname = ANY(%s)
+            ORDER BY relname
+        """,
+            (HEALTH_HOT_TABLES,),
+        )
+
+        # Dead tuple share as a cheap heap bloat estimate
+        snapshot["table_bloat"] = _health_query(
+            cursor,
+            """
+            SELECT
+                relname AS table,
+                round(n_dead_tup::numeric / NULLIF(n_live_tup + n_dead_tup, 0), 4)::float
+                    AS dead_ratio,
+                pg_relation_size(relid) AS heap_bytes,
+                to_char(GREATEST(last_vacuum, last_autovacuum), 'YYYY-MM-DD"T"HH24:MI:SS')
+                    AS last_vacuum
+            FROM pg_stat_user_tables
+            WHERE schemaname = 'public'
+            ORDER BY relname
+        """,
+        )
+
+        # Index size against what its entries need at the default 90% btree
+        # fillfactor (12 bytes of tuple overhead + key width, metapage
+        # excluded); unknown until the index has been analyzed
+        snapshot["index_bloat"] = _health_query(
+            cursor,
+            """
+            SELECT
+                s.indexrelname AS index,
+                s.idx_scan,
+                pg_relation_size(s.indexrelid) AS bytes,
+                CASE WHEN c.reltuples > 0 THEN round(GREATEST(0,
+                    1 - (c.reltuples * (12 + COALESCE(
+                        (SELECT sum(st.avg_width) FROM pg_stats st
+                         JOIN pg_attribute a ON a.attname = st.attname
+                         WHERE st.schemaname = 'public' AND st.tablename = s.relname
+                           AND a.attrelid = s.relid AND a.attnum = ANY(i.indkey)), 8)))::numeric
+                    / NULLIF((pg_relation_size(s.indexrelid) - 8192) * 0.9, 0)), 4
+                )::float END AS bloat_estimate
+            FROM pg_stat_user_indexes s
+            JOIN pg_index i ON i.indexrelid = s.indexrelid
+            JOIN pg_class c ON c.oid = s.indexrelid
+            WHERE s.schemaname = 'public'
+            ORDER BY s.indexrelname
+        """,
+        )
+
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements')"
+        )
+        if cursor.fetchone()[0]:
+            snapshot["top_queries"] = _health_query(
+                cursor,
+                """
+                SELECT
+                    queryid::text AS queryid,
+                    calls,
+                    round(total_exec_time::numeric, 1)::float AS total_ms,
+                    round(mean_exec_time::numeric, 2)::float AS mean_ms,
+                    rows,
+                    left(regexp_replace(query, '\\s+', ' ', 'g'), 200) AS query
+                FROM pg_stat_statements
+                WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+                ORDER BY total_exec_time DESC
+                LIMIT %s
+            """,
+                (HEALTH_TOP_QUERIES,),
+            )
+        else:
+            snapshot["top_queries"] = [{"error": "pg_stat_statements is not installed"}]
+
+        cursor.close()
+    return snapshot
+
+
+def probe_tenants_health(tenants: dict) -> dict:
+    """Collect health snapshots for many tenants concurrently"""
+
+    def probe(item):
+        tenant_id, database_url = item
+        try:
+            return tenant_id, collect_tenant_db_health(database_url)
+        except Exception as e:
+            logger.error(f"Health probe failed for tenant {tenant_id}: {str(e)}")
+            return tenant_id, {"error": str(e)}
+
+    if not tenants:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(HEALTH_PROBE_CONCURRENCY, len(tenants))) as pool:
+        return dict(pool.map(probe, tenants.items()))
+
+
+@app.function_name(name="TenantDbHealth")
+@app.route(route="tenant-db-health", auth_level=func.AuthLevel.FUNCTION)
+@instrumented("TenantDbHealth")
+def tenant_db_health(req: func.HttpRequest) -> func.HttpResponse:
+    """Return a performance snapshot of one, several or all tenant databases"""
+    try:
+        registered = list_registered_tenants()
+        if req.params.get("all", "").lower() == "true":
+            tenant_ids = list(registered)
+        else:
+            requested = req.params.get("tenant_ids") or req.params.get("tenant_id") or ""
+            tenant_ids = list(
+                dict.fromkeys(t.strip() for t in requested.split(",") if t.strip())
+            )
+            if not tenant_ids:
+                return func.HttpResponse(
+                    json.dumps({"error": "Missing tenant_id, tenant_ids or all=true"}),
+                    status_code=400,
+                    mimetype="application/json",
                 )
 
+        unknown = [t for t in tenant_ids if t not in registered]
+        if unknown:
+            return func.HttpResponse(
+                json.dumps({"error": f"Unknown tenants: {unknown}"}),
+                status_code=404,
+                mimetype="application/json",
+            )
+
+        snapshots = probe_tenants_health({t: registered[t] for t in tenant_ids})
+        return func.HttpResponse(
+            json.dumps(
+                {
+                    "taken_at": int(time.time()),
+                    "tenants": snapshots,
+                    "dependencies": dependency_states(),
+                },
+                sort_keys=True,
+                separators=(",", ":"),
+                default=str,
+            ),
+            status_code=200,
+            mimetype="application/json",
+        )
+
+    except Exception as e:
+        logger.exception("Error in TenantDbHealth function")
+        return func.HttpResponse(
+            json.dumps({"error": f"Failed to probe tenant database health: {str(e)}"}),
+            status_code=500,
+            mimetype="application/json",
+        )
+
+
+@app.function_name(name="Metrics")
+@app.route(route="metrics", auth_level=func.AuthLevel.FUNCTION)
+def metrics(req: func.HttpRequest) -> func.HttpResponse:
+    """Expose the service metrics in Prometheus text format"""
+    return func.HttpResponse(
+        render_metrics(),
+        status_code=200,
+        mimetype="text/plain",
+        headers={"Content-Type": "text/plain; version=0.0.4"},
+    )
+
+
+@app.function_name(name="GetDispatchStatus")
+@app.route(route="dispatch-status", auth_level=func.AuthLevel.FUNCTION)
+@instrumented("GetDispatchStatus")
+def dispatch_status(req: func.HttpRequest) -> func.HttpResponse:
+    """Get the latest coalesced workflow dispatch of a tenant"""
+    tenant_id = req.params.get("tenant_id")
+    operation = req.params.get("operation", "create")
+    workflows = {"create": "Build & Deploy Tenant", "delete": "Delete Tenant"}
+
+    if not tenant_id or operation not in workflows:
+        return func.HttpResponse(
+            json.dumps(
+                {"error": "Expected tenant_id and operation ('create' or 'delete')"}
+            ),
+            status_code=400,
+            mimetype="application/json",
+        )
+
+    status = get_dispatch_status(workflows[operation], tenant_id)
+    if not status:
+        return func.HttpResponse(
+            json.dumps({"error": f"No {operation} dispatch for tenant {tenant_id}"}),
+            status_code=404,
+            mimetype="application/json",
+        )
+    return func.HttpResponse(
+        json.dumps(status), status_code=200, mimetype="application/json"
+    )
+
+
+@app.function_name(name="DeleteTenant")
+@app.route(route="delete-tenant", auth_level=func.AuthLevel.FUNCTION)
+@instrumented("DeleteTenant")
+def delete_tenant(req: func.HttpRequest) -> func.HttpResponse:
+    """Delete a tenant and its resources"""
+    try:
+        logger.info("Starting DeleteTenant function")
+
+        # Parse request
+        try:
+            data = req.get_json()
+            if not data:
+                return func.HttpResponse(
+                    json.dumps({"error": "No JSON data provided"}),
+                    status_code=400,
+                    mimetype="application/json",
+                )
+        except Exception as e:
+            return func.HttpResponse(
+                json.dumps({"error": f"Invalid JSON: {str(e)}"}),
+                status_code=400,
+                mimetype="application/json",
+            )
+
+        # Extract and validate parameters
+        tenant_id = data.get("tenant_id")
+        gh_pat = data.get("gh_pat")
+        # Optional: where the checkpoints live if this instance never saw the tenant
+        database_url = data.get("database_url")
+
+        if not all([tenant_id, gh_pat]):
+            missing_fields = []
+            if not tenant_id:
+                missing_fields.append("tenant_id")
+            if not gh_pat:
+                missing_fields.append("gh_pat")
+
+            return func.HttpResponse(
+                json.dumps(
+                    {"error": f"Missing required fields: {', '.join(missing_fields)}"}
+                ),
+                status_code=400,
+                mimetype="application/json",
+            )
+
+        # Trigger GitHub Actions workflow for deletion
+        try:
+            dispatch = coalesced_dispatch(
+                gh_pat, "Delete Tenant", tenant_id, {"tenant_id": tenant_id}
+            )
+            workflow_id = dispatch["workflow_id"]
+
+            # A re-created tenant must be provisioned from scratch
+            clear_checkpoints(tenant_id, database_url)
+
             return func.HttpResponse(
                 json.dumps(
                     {
                         "message": f"Tenant {tenant_id} deletion initiated",
                         "tenant_id": tenant_id,
                         "status": "deletion_in_progress",
-                        "workflow_id": delete_workflow["id"],
-                        "github_actions_url": f"https://github.com/keydyy/quiz_app_ct/actions/workflows/{delete_workflow['id']}",
+                        "workflow_id": workflow_id,
+                        "github_actions_url": f"https://github.com/keydyy/quiz_app_ct/actions/workflows/{workflow_id}",
+                        "dispatch": dispatch,
                     }
                 ),
                 status_code=200,
@@ -986,8 +3800,13 @@ def delete_tenant(req: func.HttpRequest) -> func.HttpResponse:
         except Exception as e:
             logger.error(f"Error triggering deletion workflow: {str(e)}")
             return func.HttpResponse(
-                json.dumps({"error": f"Failed to trigger deletion: {str(e)}"}),
-                status_code=500,
+                json.dumps(
+                    {
+                        "error": f"Failed to trigger deletion: {str(e)}",
+                        "dependencies": dependency_states(),
+                    }
+                ),
+                status_code=dependency_error_status(e),
                 mimetype="application/json",
             )
 
@@ -1003,3 +3822,344 @@ def delete_tenant(req: func.HttpRequest) -> func.HttpResponse:
             status_code=500,
             mimetype="application/json",
         )
+
+
+# Bulk teardown. Tenants are dispatched to the Delete Tenant workflow in
+# batches of DISPATCH_BATCH_SIZE, one batch every BULK_DISPATCH_INTERVAL_SECONDS.
+# As soon as a batch is dispatched, its databases are archived and/or dropped
+# in parallel and its registry entries removed.
+BULK_DELETE_LIMIT = 200  # tenants per request
+BULK_DISPATCH_INTERVAL_SECONDS = float(
+    os.environ.get("BULK_DISPATCH_INTERVAL_SECONDS", "1.0")
+)
+TEARDOWN_CONCURRENCY = int(os.environ.get("TEARDOWN_CONCURRENCY", "8"))
+DATABASE_ACTIONS = ["drop", "archive", "keep"]
+TENANT_REGISTRY_PREFIXES = [
+    "SUPABASE_URL_",
+    "SUPABASE_KEY_",
+    "DATABASE_URL_",
+    "CPU_LIMIT_",
+    "MEMORY_LIMIT_",
+    "MIN_REPLICAS_",
+    "MAX_REPLICAS_",
+]
+
+# Everything CreateTenant and the maintenance functions put into a tenant
+# database: the Prisma tables and enums in public plus quiz_maintenance.
+TENANT_RELATIONS_SQL = """
+SELECT n.nspname, c.relname
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname IN ('public', 'quiz_maintenance')
+  AND c.relkind IN ('r', 'p')
+  AND NOT c.relispartition
+ORDER BY n.nspname, c.relname
+"""
+TENANT_ENUMS_SQL = """
+SELECT t.typname
+FROM pg_type t
+JOIN pg_namespace n ON n.oid = t.typnamespace
+WHERE n.nspname = 'public' AND t.typtype = 'e'
+"""
+TENANT_REMAINING_OBJECTS_SQL = """
+SELECT
+    (SELECT count(*) FROM pg_tables WHERE schemaname = 'public')
+    + (SELECT count(*) FROM pg_type t JOIN pg_namespace n ON n.oid = t.typnamespace
+       WHERE n.nspname = 'public' AND t.typtype = 'e')
+    + (SELECT count(*) FROM pg_namespace WHERE nspname = 'quiz_maintenance')
+"""
+
+
+def teardown_tenant_database(tenant_id: str, database_url: str, action: str) -> dict:
+    """Archive and/or drop everything the app created in a tenant database.
+
+    The public schema itself and its Supabase grants are kept; the drops run
+    in one transaction and are verified by counting what is left. When
+    archiving, nothing is dropped unless every export is durable.
+    """
+    result = {"action": action}
+    try:
+        with pooled_connection(database_url) as connection:
+            cursor = connection.cursor()
+            # A container that has not stopped yet must not block us forever
+            cursor.execute("SET LOCAL lock_timeout = '10s'")
+            cursor.execute(TENANT_RELATIONS_SQL)
+            relations = cursor.fetchall()
+
+            if action == "archive":
+                result["archives"] = [
+                    dict(
+                        export_relation(
+                            connection,
+                            tenant_id,
+                            f'"{schema}"."{table}"',
+                            f"{schema}.{table}",
+                        ),
+                        table=f"{schema}.{table}",
+                    )
+                    for schema, table in relations
+                ]
+                lost = [a["table"] for a in result["archives"] if not archive_is_durable(a)]
+                if lost:
+                    raise Exception(
+                        f"Archives of {', '.join(lost)} were not uploaded; "
+                        "refusing to drop the tenant database"
+                    )
+
+            cursor.execute(TENANT_ENUMS_SQL)
+            enums = [row[0] for row in cursor.fetchall()]
+            for schema, table in relations:
+                if schema == "public":
+                    cursor.execute(f'DROP TABLE IF EXISTS "public"."{table}" CASCADE')
+            for enum in enums:
+                cursor.execute(f'DROP TYPE IF EXISTS "public"."{enum}" CASCADE')
+            cursor.execute("DROP SCHEMA IF EXISTS quiz_maintenance CASCADE")
+            connection.commit()
+
+            cursor.execute(TENANT_REMAINING_OBJECTS_SQL)
+            remaining = cursor.fetchone()[0]
+            cursor.close()
+
+        result.update(
+            {
+                "tables_dropped": len(relations),
+                "enums_dropped": len(enums),
+                "verified": remaining == 0,
+            }
+        )
+        if remaining:
+            result["error"] = f"{remaining} objects left after teardown"
+    except Exception as e:
+        logger.error(f"Failed to tear down database of tenant {tenant_id}: {str(e)}")
+        result["error"] = str(e)
+    finally:
+        close_tenant_pool(database_url)
+    return result
+
+
+def unregister_tenant(tenant_id: str, clear_database_checkpoints: bool = True) -> list:
+    """Remove a tenant's configuration and checkpoints; returns the removed keys.
+
+    Pass clear_database_checkpoints=False when the tenant database was torn
+    down already; its checkpoints table went with it.
+    """
+    if clear_database_checkpoints:
+        clear_checkpoints(tenant_id)  # needs DATABASE_URL_, so before removal
+    removed = []
+    for prefix in TENANT_REGISTRY_PREFIXES:
+        if os.environ.pop(f"{prefix}{tenant_id}", None) is not None:
+            removed.append(f"{prefix}{tenant_id}")
+    return removed
+
+
+def bulk_teardown(gh_pat, tenant_ids: list, database_action: str) -> dict:
+    """Dispatch, clean up and unregister many tenants; returns per-tenant status"""
+    results = {
+        tenant_id: {
+            "tenant_id": tenant_id,
+            "status": "pending",
+            "dispatch": None,
+            "database": None,
+            "registry_removed": [],
+        }
+        for tenant_id in tenant_ids
+    }
+
+    def finish(tenant_id: str):
+        result = results[tenant_id]
+        database_url = os.environ.get(f"DATABASE_URL_{tenant_id}")
+        if database_action == "keep":
+            result["database"] = {"action": "keep"}
+        elif not database_url:
+            result["database"] = {
+                "action": "skipped",
+                "reason": "no database_url registered",
+            }
+        else:
+            result["database"] = teardown_tenant_database(
+                tenant_id, database_url, database_action
+            )
+
+        if result["database"].get("error"):
+            # Keep the registry so a retry can still find the database
+            result["status"] = "failed"
+            result["error"] = result["database"]["error"]
+            return
+        result["registry_removed"] = unregister_tenant(
+            tenant_id, clear_database_checkpoints=database_action == "keep"
+        )
+        if database_url:
+            close_tenant_pool(database_url)
+        result["status"] = "deleted"
+
+    futures = {}
+    with ThreadPoolExecutor(max_workers=TEARDOWN_CONCURRENCY) as executor:
+        for i in range(0, len(tenant_ids), DISPATCH_BATCH_SIZE):
+            if i:
+                time.sleep(BULK_DISPATCH_INTERVAL_SECONDS)
+            batch = new_dispatch_batch()
+            batch["entries"] = [
+                (tenant_id, {"tenant_id": tenant_id})
+                for tenant_id in tenant_ids[i : i + DISPATCH_BATCH_SIZE]
+            ]
+            send_dispatch_batch(gh_pat, "Delete Tenant", batch)
+
+            for tenant_id, _ in batch["entries"]:
+                results[tenant_id]["dispatch"] = batch["records"][tenant_id]
+                if batch["error"]:
+                    # The container may still be running, leave its data alone
+                    results[tenant_id]["status"] = "failed"
+                    results[tenant_id]["error"] = batch["error"]
+                else:
+                    futures[executor.submit(finish, tenant_id)] = tenant_id
+
+    for future, tenant_id in futures.items():
+        error = future.exception()
+        if error is not None:
+            logger.error(f"Teardown of tenant {tenant_id} failed: {str(error)}")
+            results[tenant_id]["status"] = "failed"
+            results[tenant_id]["error"] = str(error)
+
+    return results
+
+
+@app.function_name(name="BulkDeleteTenants")
+@app.route(
+    route="bulk-delete-tenants",
+    methods=["POST"],
+    auth_level=func.AuthLevel.FUNCTION,
+)
+@instrumented("BulkDeleteTenants")
+def bulk_delete_tenants(req: func.HttpRequest) -> func.HttpResponse:
+    """Delete many tenants: workflow dispatch, database cleanup and registry removal.
+
+    Body: {"tenant_ids": [...], "gh_pat": "...", "database_action":
+    "drop" | "archive" | "keep"}. "archive" needs ARCHIVE_SAS_URL or an
+    explicit ARCHIVE_DIR. Returns 200 when every tenant was deleted,
+    otherwise 207 with the status of each tenant.
+    """
+    try:
+        logger.info("Starting BulkDeleteTenants function")
+
+        # Parse request
+        try:
+            data = req.get_json()
+            if not data:
+                return func.HttpResponse(
+                    json.dumps({"error": "No JSON data provided"}),
+                    status_code=400,
+                    mimetype="application/json",
+                )
+        except Exception as e:
+            return func.HttpResponse(
+                json.dumps({"error": f"Invalid JSON: {str(e)}"}),
+                status_code=400,
+                mimetype="application/json",
+            )
+
+        tenant_ids = data.get("tenant_ids")
+        gh_pat = data.get("gh_pat")
+        database_action = data.get("database_action")
+
+        if not isinstance(tenant_ids, list) or not tenant_ids or not gh_pat:
+            return func.HttpResponse(
+                json.dumps({"error": "Missing required fields: tenant_ids, gh_pat"}),
+                status_code=400,
+                mimetype="application/json",
+            )
+        if database_action not in DATABASE_ACTIONS:
+            return func.HttpResponse(
+                json.dumps(
+                    {"error": f"database_action must be one of {DATABASE_ACTIONS}"}
+                ),
+                status_code=400,
+                mimetype="application/json",
+            )
+        if database_action == "archive" and not (
+            os.environ.get("ARCHIVE_SAS_URL") or ARCHIVE_DIR_CONFIGURED
+        ):
+            return func.HttpResponse(
+                json.dumps(
+                    {
+                        "error": "database_action 'archive' requires ARCHIVE_SAS_URL "
+                        "or ARCHIVE_DIR; the default archive directory is temporary"
+                    }
+                ),
+                status_code=400,
+                mimetype="application/json",
+            )
+        tenant_ids = list(dict.fromkeys(str(t) for t in tenant_ids if t))
+        if len(tenant_ids) > BULK_DELETE_LIMIT:
+            return func.HttpResponse(
+                json.dumps(
+                    {"error": f"At most {BULK_DELETE_LIMIT} tenant_ids per request"}
+                ),
+                status_code=400,
+                mimetype="application/json",
+            )
+
+        results = bulk_teardown(gh_pat, tenant_ids, database_action)
+        deleted = sum(1 for r in results.values() if r["status"] == "deleted")
+        body = {
+            "requested": len(tenant_ids),
+            "deleted": deleted,
+            "failed": len(tenant_ids) - deleted,
+            "database_action": database_action,
+            "tenants": results,
+        }
+        if deleted < len(tenant_ids):
+            body["dependencies"] = dependency_states()
+
+        return func.HttpResponse(
+            json.dumps(body, default=str),
+            status_code=200 if deleted == len(tenant_ids) else 207,
+            mimetype="application/json",
+        )
+
+    except Exception as e:
+        logger.exception("Error in BulkDeleteTenants function")
+        return func.HttpResponse(
+            json.dumps({"error": f"Failed to delete tenants: {str(e)}"}),
+            status_code=500,
+            mimetype="application/json",
+        )
+
+
+def warm_up() -> dict:
+    """Pre-load the migration bundle, parsed SQL and workflow IDs.
+
+    Uses the GH_PAT app setting for GitHub; without it only the public
+    repository is fetched. Returns the duration or error of every step.
+    """
+    gh_pat = os.environ.get("GH_PAT")
+    steps = {"migration_bundle": lambda: refresh_migration_bundle(gh_pat)}
+    if gh_pat:
+        steps["workflow_ids"] = lambda: resolve_workflow_ids(gh_pat)
+
+    result = {}
+    for step, run in steps.items():
+        started = time.monotonic()
+        try:
+            value = run()
+            result[step] = {"seconds": round(time.monotonic() - started, 3), "value": value}
+        except Exception as e:
+            logger.warning(f"Warm-up step {step} failed: {str(e)}")
+            result[step] = {"seconds": round(time.monotonic() - started, 3), "error": str(e)}
+    logger.info(f"Warm-up finished: {result}")
+    return result
+
+
+@app.function_name(name="WarmUp")
+@app.timer_trigger(schedule="0 */4 * * * *", arg_name="timer", run_on_startup=False)
+def warm_up_timer(timer: func.TimerRequest) -> None:
+    """Keep the caches fresh so requests never pay for a cold fetch"""
+    warm_up()
+
+
+# Timer triggers run on a single instance, so every new worker also warms its
+# own caches in the background as soon as the Functions host loads this module.
+if (
+    os.environ.get("FUNCTIONS_WORKER_RUNTIME")
+    and os.environ.get("WARM_UP_ON_START", "true").lower() == "true"
+):
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
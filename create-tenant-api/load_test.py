@@ -0,0 +1,681 @@
+"""Load generator for the tenant management functions.
+
+Drives the real CreateTenant, InitDatabase, GetTenantConfig and DeleteTenant
+handlers in-process against local stand-ins:
+
+- a local PostgreSQL server (one fresh database per provisioned tenant),
+- a stub of the GitHub Actions REST endpoints with injectable latency,
+  rate limiting and 5xx errors,
+- a local bare git repository seeded with the prisma/ directory.
+
+Reports throughput, p50/p95/p99 latency per operation and per pipeline stage
+(taken from the function_app metrics registry) and groups failures by cause.
+
+Requirements: the packages of requirements.txt (azure-functions, requests,
+psycopg2-binary) installed with `pip install -r requirements.txt`, the git
+command line on PATH, and a PostgreSQL server whose --database-url role may
+CREATE DATABASE. Nothing else is needed; the Functions host is not used.
+
+Example:
+    python load_test.py --database-url postgresql://postgres@127.0.0.1:5432/postgres \\
+        --requests 200 --concurrency 16 --rate 10 --github-error-rate 0.05
+
+    # find the concurrency at which the error rate crosses 5%
+    python load_test.py --database-url ... --sweep 1,4,16,64 --max-error-rate 0.05
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse
+
+import azure.functions as func
+import psycopg2
+
+import function_app
+
+logger = logging.getLogger("load_test")
+
+OPERATIONS = ["create", "init", "get", "delete"]
+DEFAULT_MIX = "create=4,init=1,get=10,delete=2"
+WORKFLOWS = [
+    {"id": 1001, "name": "Build & Deploy Tenant"},
+    {"id": 1002, "name": "Delete Tenant"},
+]
+STUB_URL_STEP = 7  # step number of "Get Container App URL" in the stub
+
+
+class GitHubStub(ThreadingHTTPServer):
+    """Local stand-in for the GitHub Actions REST endpoints used by function_app"""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        rate_limit=0,
+        rate_window=60.0,
+        seed=None,
+    ):
+        super().__init__(("127.0.0.1", 0), GitHubStubHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.stats = {
+            "requests": 0,
+            "injected_errors": 0,
+            "rate_limited": 0,
+            "dispatches": 0,
+            "dispatched_tenants": 0,
+        }
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def admit(self):
+        """Decide the fate of one request: None to serve it, else an error status"""
+        with self.lock:
+            self.stats["requests"] += 1
+            now = time.monotonic()
+            if now - self.window_start >= self.rate_window:
+                self.window_start = now
+                self.window_count = 0
+            self.window_count += 1
+            if self.rate_limit and self.window_count > self.rate_limit:
+                self.stats["rate_limited"] += 1
+                return 403
+            if self.random.random() < self.error_rate:
+                self.stats["injected_errors"] += 1
+                return self.random.choice([500, 502, 503])
+            delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        return None
+
+    def rate_limit_reset(self) -> int:
+        return int(time.time() + self.rate_window)
+
+    def record_dispatch(self, inputs: dict):
+        tenants = json.loads(inputs["tenants"]) if "tenants" in inputs else [inputs]
+        with self.lock:
+            self.stats["dispatches"] += 1
+            self.stats["dispatched_tenants"] += len(tenants)
+
+
+class GitHubStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    ROUTES = [
+        ("GET", r"/repos/[^/]+/[^/]+/actions/workflows", "workflows"),
+        ("POST", r"/repos/[^/]+/[^/]+/actions/workflows/\d+/dispatches", "dispatch"),
+        ("GET", r"/repos/[^/]+/[^/]+/actions/runs/\d+", "run"),
+        ("GET", r"/repos/[^/]+/[^/]+/actions/runs/\d+/jobs", "jobs"),
+        ("GET", r"/repos/[^/]+/[^/]+/actions/jobs/\d+/steps", "steps"),
+        ("GET", r"/repos/[^/]+/[^/]+/actions/jobs/\d+/steps/\d+/logs", "logs"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_api("GET")
+
+    def do_POST(self):
+        self.handle_api("POST")
+
+    def send(self, status: int, body=None, headers=None, content_type="application/json"):
+        payload = b""
+        if body is not None:
+            payload = (body if isinstance(body, str) else json.dumps(body)).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def handle_api(self, method: str):
+        length = int(self.headers.get("Content-Length") or 0)
+        request_body = self.rfile.read(length) if length else b""
+
+        path = urlparse(self.path).path
+        route = next(
+            (name for m, pattern, name in self.ROUTES
+             if m == method and re.fullmatch(pattern, path)),
+            None,
+        )
+        if route is None:
+            self.send(404, {"message": "Not Found"})
+            return
+
+        status = self.server.admit()
+        if status == 403:
+            self.send(
+                403,
+                {"message": "API rate limit exceeded"},
+                headers={
+                    "X-RateLimit-Remaining": 0,
+                    "X-RateLimit-Reset": self.server.rate_limit_reset(),
+                },
+            )
+            return
+        if status:
+            self.send(status, {"message": "Server Error"})
+            return
+
+        if route == "workflows":
+            self.send(200, {"total_count": len(WORKFLOWS), "workflows": WORKFLOWS})
+        elif route == "dispatch":
+            payload = json.loads(request_body or b"{}")
+            self.server.record_dispatch(payload.get("inputs", {}))
+            self.send(204)
+        elif route == "run":
+            self.send(200, {"id": int(path.rsplit("/", 1)[1]), "status": "in_progress"})
+        elif route == "jobs":
+            run_id = int(path.split("/")[-2])
+            self.send(200, {"jobs": [{"id": run_id * 10, "name": "build_and_deploy"}]})
+        elif route == "steps":
+            self.send(
+                200,
+                {"steps": [{"number": STUB_URL_STEP, "name": "Get Container App URL"}]},
+            )
+        else:
+            self.send(
+                200,
+                "container_url=https://quiz-app-loadtest.azurecontainerapps.io\n",
+                content_type="text/plain",
+            )
+
+
+def create_bare_repository(workdir: str, prisma_dir: Path) -> str:
+    """Create a bare git repository whose main branch holds prisma_dir"""
+    bare = os.path.join(workdir, "quiz_app_ct.git")
+    seed = os.path.join(workdir, "seed")
+    shutil.copytree(prisma_dir, os.path.join(seed, "prisma"))
+
+    git = ["git", "-c", "user.name=load-test", "-c", "user.email=load-test@localhost"]
+    subprocess.run(["git", "init", "-q", "--bare", bare], check=True)
+    subprocess.run(["git", "init", "-q", seed], check=True)
+    subprocess.run(git + ["-C", seed, "add", "-A"], check=True)
+    subprocess.run(git + ["-C", seed, "commit", "-q", "-m", "seed"], check=True)
+    subprocess.run(["git", "-C", seed, "push", "-q", bare, "HEAD:refs/heads/main"], check=True)
+    return "file://" + bare
+
+
+def parse_mix(mix: str) -> dict:
+    """Parse "create=4,get=10" into operation weights"""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation in mix: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentile(values: list, pct: float):
+    """Nearest-rank percentile of values, or None when there are none"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(values: list) -> dict:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+    }
+
+
+def failure_cause(body) -> str:
+    """Reduce an error body to a cause that groups equal failures together"""
+    if isinstance(body, dict):
+        text = str(body.get("error") or body.get("message") or body)
+    else:
+        text = str(body)
+    text = re.sub(r"lt-[0-9a-f]+-\d+", "<tenant>", text)
+    text = re.sub(r"loadtest_[0-9a-f]+_\d+", "<database>", text)
+    text = re.sub(r"\d+", "N", text.splitlines()[0] if text else "")
+    return text[:160]
+
+
+class LoadTest:
+    """One load-test run at a fixed concurrency and arrival rate"""
+
+    def __init__(self, args, admin_url: str, concurrency: int):
+        self.args = args
+        self.admin_url = admin_url
+        self.concurrency = concurrency
+        self.run_id = uuid.uuid4().hex[:8]
+        self.random = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.databases = []
+        self.next_database = 0
+        self.active_tenants = []
+        self.tenant_count = 0
+        self.results = []
+        self.samples = {}  # (histogram, label) -> [seconds]
+
+    # Databases ------------------------------------------------------------
+
+    def admin_connection(self):
+        params = function_app.parse_database_url(self.admin_url)
+        connection = psycopg2.connect(
+            host=params["host"],
+            port=params["port"],
+            database=params["database"],
+            user=params["user"],
+            password=params["password"],
+            sslmode=function_app.DATABASE_SSLMODE,
+        )
+        connection.autocommit = True
+        return connection
+
+    def tenant_database_url(self, name: str) -> str:
+        parsed = urlparse(self.admin_url)
+        return parsed._replace(path=f"/{name}").geturl()
+
+    def create_databases(self, count: int):
+        """Create one empty database per tenant the run may provision"""
+        connection = self.admin_connection()
+        try:
+            cursor = connection.cursor()
+            for i in range(count):
+                name = f"loadtest_{self.run_id}_{i}"
+                cursor.execute(f'CREATE DATABASE "{name}"')
+                self.databases.append(name)
+        finally:
+            connection.close()
+
+    def drop_databases(self):
+        for name in self.databases:
+            function_app.close_tenant_pool(self.tenant_database_url(name))
+        connection = self.admin_connection()
+        try:
+            cursor = connection.cursor()
+            for name in self.databases:
+                cursor.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+        finally:
+            connection.close()
+
+    def take_database(self) -> str:
+        with self.lock:
+            name = self.databases[self.next_database]
+            self.next_database += 1
+        return self.tenant_database_url(name)
+
+    # Operations -----------------------------------------------------------
+
+    def new_tenant_id(self) -> str:
+        with self.lock:
+            self.tenant_count += 1
+            return f"lt-{self.run_id}-{self.tenant_count}"
+
+    def pick_tenant(self, remove: bool):
+        with self.lock:
+            if not self.active_tenants:
+                return None
+            index = self.random.randrange(len(self.active_tenants))
+            if remove:
+                return self.active_tenants.pop(index)
+            return self.active_tenants[index]
+
+    def build_request(self, op: str):
+        """Return (operation, handler, request) for a scheduled operation"""
+        if op in ("get", "delete"):
+            tenant_id = self.pick_tenant(remove=op == "delete")
+            if tenant_id is None:
+                op = "create"  # nothing provisioned yet
+        if op == "get":
+            return op, function_app.get_tenant_config, func.HttpRequest(
+                "GET", "/api/get-tenant-config", params={"tenant_id": tenant_id}, body=b""
+            )
+        if op == "delete":
+            body = {"tenant_id": tenant_id, "gh_pat": self.args.gh_pat}
+            return op, function_app.delete_tenant, func.HttpRequest(
+                "POST", "/api/delete-tenant", body=json.dumps(body).encode()
+            )
+        if op == "init":
+            body = {
+                "tenant_id": self.new_tenant_id(),
+                "database_url": self.take_database(),
+                "gh_pat": self.args.gh_pat,
+            }
+            return op, function_app.init_database, func.HttpRequest(
+                "POST", "/api/init-database", body=json.dumps(body).encode()
+            )
+        body = {
+            "tenant_id": self.new_tenant_id(),
+            "supabase_url": "http://127.0.0.1:54321",
+            "supabase_anon_key": "load-test-anon-key",
+            "database_url": self.take_database(),
+            "gh_pat": self.args.gh_pat,
+            "performance_profile": self.args.performance_profile,
+        }
+        return op, function_app.main, func.HttpRequest(
+            "POST", "/api/create-tenant", body=json.dumps(body).encode()
+        )
+
+    def execute(self, op: str, scheduled_at: float):
+        started = time.monotonic()
+        op, handler, request = self.build_request(op)
+        try:
+            response = handler(request)
+            status = response.status_code
+            raw = response.get_body()
+            try:
+                body = json.loads(raw) if raw else {}
+            except ValueError:
+                body = raw.decode(errors="replace")
+        except Exception as e:
+            status, body = "exception", {"error": f"{type(e).__name__}: {e}"}
+        finished = time.monotonic()
+
+        if op == "create" and status == 200:
+            with self.lock:
+                self.active_tenants.append(body["tenant_id"])
+        result = {
+            "operation": op,
+            "status": status,
+            "ok": isinstance(status, int) and status < 400,
+            "service_time": finished - started,
+            "queue_wait": started - scheduled_at,
+            "latency": finished - scheduled_at,
+        }
+        if not result["ok"]:
+            result["cause"] = failure_cause(body)
+        with self.lock:
+            self.results.append(result)
+
+    def schedule(self) -> list:
+        """Operations and their arrival offsets (Poisson when a rate is set)"""
+        weights = parse_mix(self.args.mix)
+        names = list(weights)
+        ops = self.random.choices(names, [weights[n] for n in names], k=self.args.requests)
+        arrivals, offset = [], 0.0
+        for _ in ops:
+            arrivals.append(offset)
+            if self.args.rate:
+                offset += self.random.expovariate(self.args.rate)
+        return list(zip(ops, arrivals))
+
+    # Run ------------------------------------------------------------------
+
+    def record_observation(self, name: str, value: float, labels=None):
+        label = (labels or {}).get("stage") or (labels or {}).get("function")
+        with self.lock:
+            self.samples.setdefault((name, label), []).append(value)
+
+    def counters(self) -> dict:
+        with function_app._metrics_lock:
+            return dict(function_app._counters)
+
+    def run(self) -> dict:
+        plan = self.schedule()
+        # get/delete fall back to a create while no tenant exists yet, so
+        # every operation may need a database
+        logger.info(f"Creating {len(plan)} databases for run {self.run_id}")
+        self.create_databases(len(plan))
+
+        original_observe = function_app.observe_histogram
+
+        def observe(name, value, labels=None):
+            original_observe(name, value, labels)
+            self.record_observation(name, value, labels)
+
+        counters_before = self.counters()
+        function_app.observe_histogram = observe
+        started = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                for op, offset in plan:
+                    delay = started + offset - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    executor.submit(self.execute, op, started + offset)
+        finally:
+            function_app.observe_histogram = original_observe
+        duration = time.monotonic() - started
+        counters_after = self.counters()
+
+        try:
+            if not self.args.keep_databases:
+                self.drop_databases()
+        finally:
+            prefix = f"lt-{self.run_id}-"
+            for key in [k for k in os.environ if prefix in k]:
+                del os.environ[key]
+
+        return self.report(duration, counters_before, counters_after)
+
+    def report(self, duration: float, before: dict, after: dict) -> dict:
+        ok = [r for r in self.results if r["ok"]]
+        operations = {}
+        for op in OPERATIONS:
+            results = [r for r in self.results if r["operation"] == op]
+            if results:
+                operations[op] = dict(
+                    summarize([r["service_time"] for r in results]),
+                    ok=sum(1 for r in results if r["ok"]),
+                    queue_wait_p95=percentile([r["queue_wait"] for r in results], 95),
+                    latency_p95=percentile([r["latency"] for r in results], 95),
+                )
+
+        stages = {}
+        for (name, label), values in sorted(self.samples.items(), key=str):
+            if name == "tenant_stage_duration_seconds":
+                failed = after.get(
+                    ("tenant_stage_total", (("outcome", "error"), ("stage", label))), 0
+                ) - before.get(
+                    ("tenant_stage_total", (("outcome", "error"), ("stage", label))), 0
+                )
+                stages[label] = dict(summarize(values), errors=failed)
+
+        github_statuses = {}
+        for (name, labels), value in after.items():
+            if name == "github_requests_total":
+                delta = value - before.get((name, labels), 0)
+                if delta:
+                    github_statuses[dict(labels)["status"]] = delta
+
+        failures = {}
+        for r in self.results:
+            if not r["ok"]:
+                key = f"{r['operation']} {r['status']}: {r['cause']}"
+                failures[key] = failures.get(key, 0) + 1
+
+        total = len(self.results)
+        return {
+            "concurrency": self.concurrency,
+            "arrival_rate": self.args.rate,
+            "requests": total,
+            "duration": duration,
+            "throughput": total / duration if duration else 0.0,
+            "ok_throughput": len(ok) / duration if duration else 0.0,
+            "error_rate": (total - len(ok)) / total if total else 0.0,
+            "operations": operations,
+            "stages": stages,
+            "github_statuses": github_statuses,
+            "failures": dict(sorted(failures.items(), key=lambda item: -item[1])),
+        }
+
+
+def format_seconds(value) -> str:
+    return "-" if value is None else f"{value:.3f}"
+
+
+def print_report(report: dict):
+    rate = f"{report['arrival_rate']}/s" if report["arrival_rate"] else "closed loop"
+    print(
+        f"\n== concurrency {report['concurrency']}, arrivals {rate}: "
+        f"{report['requests']} requests in {report['duration']:.1f}s"
+    )
+    print(
+        f"throughput {report['throughput']:.2f} req/s "
+        f"({report['ok_throughput']:.2f} ok/s), error rate {report['error_rate']:.1%}"
+    )
+
+    print(f"\n{'operation':<12}{'count':>7}{'ok':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'wait p95':>10}")
+    for op, stats in report["operations"].items():
+        print(
+            f"{op:<12}{stats['count']:>7}{stats['ok']:>7}"
+            f"{format_seconds(stats['p50']):>9}{format_seconds(stats['p95']):>9}"
+            f"{format_seconds(stats['p99']):>9}{format_seconds(stats['queue_wait_p95']):>10}"
+        )
+
+    print(f"\n{'stage':<12}{'count':>7}{'errors':>7}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for stage, stats in report["stages"].items():
+        print(
+            f"{stage:<12}{stats['count']:>7}{stats['errors']:>7}"
+            f"{format_seconds(stats['p50']):>9}{format_seconds(stats['p95']):>9}"
+            f"{format_seconds(stats['p99']):>9}"
+        )
+
+    statuses = ", ".join(f"{k}: {v}" for k, v in sorted(report["github_statuses"].items()))
+    print(f"\nGitHub responses by status: {statuses or 'none'}")
+    print(
+        "GitHub stub: {requests} requests, {injected_errors} injected 5xx, "
+        "{rate_limited} rate limited, {dispatches} dispatches for "
+        "{dispatched_tenants} tenants".format(**report["github_stub"])
+    )
+
+    if report["failures"]:
+        print("\nFailure modes:")
+        for cause, count in report["failures"].items():
+            print(f"  {count:>5}x {cause}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--database-url",
+        default=os.environ.get("LOAD_TEST_DATABASE_URL"),
+        help="URL of a local Postgres database allowed to CREATE DATABASE",
+    )
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--rate", type=float, default=0.0,
+        help="mean arrivals per second (Poisson); 0 submits everything at once",
+    )
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"default: {DEFAULT_MIX}")
+    parser.add_argument(
+        "--sweep", help="comma-separated concurrency levels to run one after another"
+    )
+    parser.add_argument(
+        "--max-error-rate", type=float,
+        help="exit with status 1 when a run's error rate exceeds this fraction",
+    )
+    parser.add_argument("--performance-profile", action="store_true")
+    parser.add_argument("--github-latency", type=float, default=0.05)
+    parser.add_argument("--github-jitter", type=float, default=0.05)
+    parser.add_argument("--github-error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--github-rate-limit", type=int, default=0,
+        help="requests allowed per --github-rate-window before 403s (0: unlimited)",
+    )
+    parser.add_argument("--github-rate-window", type=float, default=60.0)
+    parser.add_argument("--gh-pat", default="load-test-token")
+    parser.add_argument(
+        "--prisma-dir", type=Path,
+        default=Path(__file__).resolve().parent.parent / "prisma",
+    )
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--keep-databases", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print reports as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep function_app logs")
+    args = parser.parse_args(argv)
+    if not args.database_url:
+        parser.error("--database-url (or LOAD_TEST_DATABASE_URL) is required")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    if not args.verbose:
+        logging.getLogger(function_app.__name__).setLevel(logging.CRITICAL)
+
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    stub = GitHubStub(
+        latency=args.github_latency,
+        jitter=args.github_jitter,
+        error_rate=args.github_error_rate,
+        rate_limit=args.github_rate_limit,
+        rate_window=args.github_rate_window,
+        seed=args.seed,
+    )
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    try:
+        function_app.REPO_URL = create_bare_repository(workdir, args.prisma_dir)
+        function_app.GITHUB_API_URL = stub.url
+        if "DATABASE_SSLMODE" not in os.environ:
+            function_app.DATABASE_SSLMODE = "disable"
+
+        levels = [int(c) for c in args.sweep.split(",")] if args.sweep else [args.concurrency]
+        reports = []
+        for concurrency in levels:
+            stats_before = dict(stub.stats)
+            report = LoadTest(args, args.database_url, concurrency).run()
+            report["github_stub"] = {k: stub.stats[k] - stats_before[k] for k in stub.stats}
+            reports.append(report)
+            if not args.json:
+                print_report(report)
+
+        if args.json:
+            print(json.dumps(reports if args.sweep else reports[0], indent=2))
+        elif args.sweep:
+            print(f"\n{'concurrency':>12}{'req/s':>9}{'ok/s':>9}{'errors':>9}{'create p95':>12}")
+            for report in reports:
+                create = report["operations"].get("create", {})
+                print(
+                    f"{report['concurrency']:>12}{report['throughput']:>9.2f}"
+                    f"{report['ok_throughput']:>9.2f}{report['error_rate']:>9.1%}"
+                    f"{format_seconds(create.get('p95')):>12}"
+                )
+
+        if args.max_error_rate is not None:
+            over = [r for r in reports if r["error_rate"] > args.max_error_rate]
+            if over:
+                print(
+                    f"\nError rate above {args.max_error_rate:.1%} "
+                    f"from concurrency {over[0]['concurrency']}",
+                    file=sys.stderr,
+                )
+                return 1
+        return 0
+    finally:
+        stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
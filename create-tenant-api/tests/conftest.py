@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# function_app.py lives next to this directory, not in an installed package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
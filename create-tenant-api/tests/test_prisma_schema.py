@@ -0,0 +1,71 @@
+from pathlib import Path
+
+import function_app
+
+SCHEMA_PATH = Path(__file__).resolve().parents[2] / "prisma" / "schema.prisma"
+
+
+def parse_schema():
+    return function_app.parse_prisma_schema(SCHEMA_PATH.read_text())
+
+
+def test_defaults_of_the_real_schema():
+    tables = parse_schema()["tables"]
+    defaults = {
+        (table, column): spec["default"]
+        for table, description in tables.items()
+        for column, spec in description["columns"].items()
+        if spec["default"] is not None
+    }
+
+    assert defaults == {
+        ("GameInvitations", "status"): "'Pending'",
+        ("Questions", "approved"): "false",
+        ("quizzes", "creation_date"): "CURRENT_TIMESTAMP",
+        ("quizzes", "logo"): "'tuwstawswojamorde.png'",
+        ("Statistics", "total_quizzes_taken"): "0",
+        ("Statistics", "total_correct_answers"): "0",
+        ("users", "avatar_url"): "'https://t4.ftcdn.net/jpg/05/49/98/39/"
+        "360_F_549983970_bRCkYfk0P6PP5fKbMhZMIb07mCJ6esXL.jpg'",
+        ("friends", "created_at"): "CURRENT_TIMESTAMP",
+        ("friends", "status"): "'Pending'",
+    }
+
+
+def test_autoincrement_columns_are_serial():
+    tables = parse_schema()["tables"]
+
+    assert tables["GameAnswers"]["columns"]["answer_id"]["sql_type"] == "SERIAL"
+    assert tables["friends"]["columns"]["id"]["sql_type"] == "SERIAL"
+
+
+def test_comments_are_stripped_outside_strings_only():
+    strip = function_app._strip_prisma_comment
+
+    assert strip('url String @default("https://example.com") // note') == (
+        'url String @default("https://example.com") '
+    )
+    assert strip('name String @default("a \\" // b")') == 'name String @default("a \\" // b")'
+    assert strip("// whole line") == ""
+
+
+def test_nullability_drift_is_reported_not_altered():
+    desired = parse_schema()
+    actual = {
+        "tables": {
+            table: {
+                column: {"catalog_type": spec["catalog_type"], "not_null": spec["not_null"]}
+                for column, spec in description["columns"].items()
+            }
+            for table, description in desired["tables"].items()
+        },
+        "enums": dict(desired["enums"]),
+        "constraints": set(),
+        "indexes": set(),
+    }
+    actual["tables"]["users"]["avatar_url"]["not_null"] = True
+
+    diff = function_app.diff_schema(desired, actual)
+
+    assert not [s for s in diff["statements"] if "ALTER COLUMN" in s]
+    assert "users.avatar_url: is NOT NULL, expected nullable" in diff["unresolved"]
@@ -34,6 +34,7 @@ variable "container_apps" {
     name               = optional(string)
     supabase_url       = optional(string)
     supabase_anon_key  = optional(string)
+    image              = optional(string) # shared digest-pinned image; defaults to the per-tenant image
     cpu                = optional(number)
     memory             = optional(string)
     custom_domain      = optional(string)
@@ -290,7 +291,7 @@ resource "azurerm_container_app" "quiz_app" {
     
     container {
       name   = "nextjs"
-      image  = "ghcr.io/${var.ghcr_username}/${var.image_name}-${each.key}:latest"
+      image  = coalesce(each.value.image, "ghcr.io/${var.ghcr_username}/${var.image_name}-${each.key}:latest")
       cpu    = each.value.cpu
       memory = each.value.memory
 
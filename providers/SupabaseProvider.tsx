@@ -5,20 +5,28 @@ import { createClientComponentClient } from "@supabase/auth-helpers-nextjs";
 import { SessionContextProvider } from "@supabase/auth-helpers-react";
 
 import { Database } from "../types_db";
+import { RuntimeConfig, setRuntimeConfig } from "@/lib/runtimeConfig";
 
 import {QueryClient, QueryClientProvider} from "@tanstack/react-query";
 
 const queryClient = new QueryClient();
 interface SupabaseProviderProps {
     children: React.ReactNode;
+    config: RuntimeConfig;
 };
 
 const SupabaseProvider: React.FC<SupabaseProviderProps> = ({
-    children
+    children,
+    config
 }) => {
-    const [supabaseClient] = useState(() =>
-        createClientComponentClient<Database>()
-    );
+    const [supabaseClient] = useState(() => {
+        // Set before any child renders, so src/lib/supabase can use it
+        setRuntimeConfig(config);
+        return createClientComponentClient<Database>({
+            supabaseUrl: config.supabaseUrl,
+            supabaseKey: config.supabaseAnonKey,
+        });
+    });
 
     return (
         <QueryClientProvider client={queryClient}>
@@ -29,4 +37,4 @@ const SupabaseProvider: React.FC<SupabaseProviderProps> = ({
     );
 }
 
-export default SupabaseProvider;
\ No newline at end of file
+export default SupabaseProvider;
@@ -11,6 +11,7 @@ import { Inter } from "next/font/google";
 import UserProvider from "../../providers/UserProvider";
 import ModalProvider from "../../providers/ModalProvider";
 import SupabaseProvider from "../../providers/SupabaseProvider";
+import { readRuntimeConfig } from "@/lib/runtimeConfig";
 import Notification from "@/components/Notifications";
 import { SidebarProvider } from "../../providers/SidebarContext";
 
@@ -26,11 +27,17 @@ export const metadata: Metadata = {
   description: "Quiz_app with AI's questions!",
 };
 
+// Render per request so the tenant's Supabase settings come from the
+// container's env, not from whatever was set when the image was built.
+export const dynamic = "force-dynamic";
+
 export default async function RootLayout({
   children,
 }: {
   children: React.ReactNode;
 }) {
+  const runtimeConfig = readRuntimeConfig();
+
   return (
     <html lang="en">
       <Head>
@@ -47,7 +54,7 @@ export default async function RootLayout({
       >
         {/* <ToasterProvider /> */}
 
-        <SupabaseProvider>
+        <SupabaseProvider config={runtimeConfig}>
           <UserProvider>
             <ModalProvider />
 
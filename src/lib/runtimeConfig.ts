@@ -0,0 +1,40 @@
+// Tenant settings read when a request is served instead of when the image is
+// built, so one image can be deployed for every tenant. The container gets
+// them as env vars (main.tf); the root layout reads them on the server and
+// SupabaseProvider hands them to the browser.
+
+export interface RuntimeConfig {
+  supabaseUrl: string;
+  supabaseAnonKey: string;
+  tenantId: string;
+}
+
+let browserConfig: RuntimeConfig | undefined;
+
+// Next.js inlines process.env.NEXT_PUBLIC_* at build time; looking the name up
+// through a variable keeps it a runtime read on the server.
+function readEnv(name: string): string {
+  return process.env[name] ?? "";
+}
+
+export function readRuntimeConfig(): RuntimeConfig {
+  return {
+    supabaseUrl: readEnv("NEXT_PUBLIC_SUPABASE_URL"),
+    supabaseAnonKey: readEnv("NEXT_PUBLIC_SUPABASE_ANON_KEY"),
+    tenantId: readEnv("NEXT_PUBLIC_TENANT_ID"),
+  };
+}
+
+export function setRuntimeConfig(config: RuntimeConfig) {
+  browserConfig = config;
+}
+
+export function getRuntimeConfig(): RuntimeConfig {
+  if (typeof window === "undefined") {
+    return readRuntimeConfig();
+  }
+  if (!browserConfig) {
+    throw new Error("Runtime config is not set yet; SupabaseProvider sets it");
+  }
+  return browserConfig;
+}
@@ -1,7 +1,22 @@
-import { createClient } from "@supabase/supabase-js";
+import { createClient, SupabaseClient } from "@supabase/supabase-js";
 
-const supabaseUrl: string = process.env.NEXT_PUBLIC_SUPABASE_URL!;
-const supabaseKey: string = process.env.NEXT_PUBLIC_SUPABASE_ANON_KEY!;
+import { getRuntimeConfig } from "./runtimeConfig";
 
+let client: SupabaseClient | undefined;
 
-export const supabase = createClient(supabaseUrl, supabaseKey);
\ No newline at end of file
+function getClient(): SupabaseClient {
+  if (!client) {
+    const { supabaseUrl, supabaseAnonKey } = getRuntimeConfig();
+    client = createClient(supabaseUrl, supabaseAnonKey);
+  }
+  return client;
+}
+
+// Created on first use: the Supabase URL and key are only known at runtime.
+export const supabase = new Proxy({} as SupabaseClient, {
+  get(_target, property) {
+    const instance = getClient();
+    const value = Reflect.get(instance, property, instance);
+    return typeof value === "function" ? value.bind(instance) : value;
+  },
+});